@@ -5,6 +5,9 @@ from django.utils.translation import gettext_lazy as _
 from allauth.account.forms import SignupForm
 
 from profiles.models import Profile
+from profiles.ranking import ranking_engine
+from profiles.search import refresh_search_document
+from profiles.skills import sync_profile_skills
 
 ROLE_CHOICES = [
     ("client", "Client (Looking for developers)"),
@@ -69,7 +72,7 @@ class ConnectSignupForm(SignupForm):
             user.first_name = full_name
             user.save(update_fields=["first_name"])
 
-        Profile.objects.update_or_create(
+        profile, _ = Profile.objects.update_or_create(
             user=user,
             defaults={
                 "headline": role.replace("_", " ").title() if role else "",
@@ -78,6 +81,9 @@ class ConnectSignupForm(SignupForm):
                 "role": role or Profile.ROLE_DEVELOPER,
             },
         )
+        refresh_search_document(profile)
+        sync_profile_skills(profile)
+        ranking_engine.update(profile)
         return user
 
     def clean(self):
@@ -2,6 +2,8 @@ from django.dispatch import receiver
 from allauth.account.signals import user_signed_up, user_logged_in
 
 from profiles.models import Profile
+from profiles.ranking import ranking_engine
+from profiles.search import refresh_search_document
 
 
 def ensure_profile(user, full_name=None, role=None):
@@ -10,7 +12,10 @@ def ensure_profile(user, full_name=None, role=None):
         defaults["headline"] = full_name
     if role:
         defaults["bio"] = role
-    Profile.objects.update_or_create(user=user, defaults=defaults)
+    profile, created = Profile.objects.update_or_create(user=user, defaults=defaults)
+    if created or defaults:
+        refresh_search_document(profile)
+        ranking_engine.update(profile)
 
 
 @receiver(user_signed_up)
@@ -0,0 +1,201 @@
+"""
+Cold storage for old messages.
+
+``archive_range`` streams a time range of ``messaging_message`` into a
+segment file under ``MESSAGE_ARCHIVE_DIR`` and deletes it from the table, so
+the hot table (and its indexes and vacuum work) only ever holds recent
+history. A segment is JSON lines written as a series of gzip members, one
+block of at most ``ARCHIVE_BLOCK_SIZE`` messages of a single conversation
+each; ``MessageArchiveBlock`` rows record where every block starts, so a
+reader seeks straight to the blocks a page needs and decompresses only those.
+"""
+import gzip
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
+
+from .models import Conversation, Message, MessageArchiveBlock
+
+ARCHIVE_BLOCK_SIZE = 256
+BLOCK_READ_BATCH = 8
+UPDATE_BATCH = 1000
+
+
+def archive_path(segment):
+    return Path(settings.MESSAGE_ARCHIVE_DIR) / segment
+
+
+class SegmentWriter:
+    """
+    Appends blocks to a new segment under a temporary name; ``publish``
+    syncs it and moves it into place.
+    """
+
+    def __init__(self, name):
+        directory = Path(settings.MESSAGE_ARCHIVE_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        stem, n = name, 1
+        while (directory / name).exists():
+            n += 1
+            name = f"{stem.removesuffix('.jsonl.gz')}-{n}.jsonl.gz"
+        self.name = name
+        self.path = directory / name
+        self._tmp = directory / f".{name}.tmp"
+        self._file = open(self._tmp, "wb")
+        self.blocks = []
+
+    def write_block(self, conversation_id, rows):
+        payload = "".join(
+            json.dumps(
+                {
+                    "id": pk,
+                    "conversation": conversation_id,
+                    "sender": sender_id,
+                    "text": text,
+                    "created": created.isoformat(),
+                },
+                separators=(",", ":"),
+            )
+            + "\n"
+            for pk, _, sender_id, text, created in rows
+        )
+        data = gzip.compress(payload.encode(), mtime=0)
+        self.blocks.append(
+            MessageArchiveBlock(
+                conversation_id=conversation_id,
+                segment=self.name,
+                offset=self._file.tell(),
+                length=len(data),
+                message_count=len(rows),
+                first_created=rows[0][4],
+                first_id=rows[0][0],
+                last_created=rows[-1][4],
+                last_id=rows[-1][0],
+            )
+        )
+        self._file.write(data)
+
+    def publish(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._tmp, self.path)
+
+    def discard(self):
+        self._file.close()
+        for path in (self._tmp, self.path):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+
+def archive_range(start, end, segment):
+    """
+    Move the messages created in ``[start, end)`` into a new segment named
+    after ``segment`` and delete them from the hot table, in one transaction
+    with the block index and ``Conversation.archived_through``. Streams rows
+    in (conversation, created, id) order, so memory stays flat however large
+    the range. Returns the number of messages moved and the ids of the
+    conversations they came from.
+    """
+    in_range = Message.objects.filter(created__gte=start, created__lt=end)
+    rows = (
+        in_range.order_by("conversation_id", "created", "id")
+        .values_list("id", "conversation_id", "sender_id", "text", "created")
+        .iterator(chunk_size=2000)
+    )
+    writer = None
+    moved = 0
+    touched = []
+    block = []
+    for row in rows:
+        if writer is None:
+            writer = SegmentWriter(segment)
+        if block and (row[1] != block[0][1] or len(block) >= ARCHIVE_BLOCK_SIZE):
+            writer.write_block(block[0][1], block)
+            block = []
+        if not touched or touched[-1] != row[1]:
+            touched.append(row[1])
+        block.append(row)
+        moved += 1
+    if writer is None:
+        return 0, []
+    writer.write_block(block[0][1], block)
+
+    try:
+        writer.publish()
+        with transaction.atomic():
+            MessageArchiveBlock.objects.bulk_create(writer.blocks, batch_size=UPDATE_BATCH)
+            deleted, _ = in_range.delete()
+            if deleted != moved:
+                raise RuntimeError(
+                    f"{deleted} messages in range at delete time, {moved} archived; rolled back"
+                )
+            newest = (
+                MessageArchiveBlock.objects.filter(conversation=OuterRef("pk"))
+                .order_by("-last_created")
+                .values("last_created")[:1]
+            )
+            for i in range(0, len(touched), UPDATE_BATCH):
+                ids = touched[i : i + UPDATE_BATCH]
+                Conversation.objects.filter(pk__in=ids).update(archived_through=Subquery(newest))
+    except BaseException:
+        writer.discard()
+        raise
+    return moved, touched
+
+
+def _read_block(block):
+    with open(archive_path(block.segment), "rb") as f:
+        f.seek(block.offset)
+        data = f.read(block.length)
+    messages = []
+    for line in gzip.decompress(data).splitlines():
+        row = json.loads(line)
+        messages.append(
+            Message(
+                id=row["id"],
+                conversation_id=row["conversation"],
+                sender_id=row["sender"],
+                text=row["text"],
+                created=datetime.fromisoformat(row["created"]),
+            )
+        )
+    return messages
+
+
+def read_archive(conversation, before=None, limit=ARCHIVE_BLOCK_SIZE):
+    """
+    Up to ``limit`` archived messages of ``conversation`` preceding the
+    ``before`` (created, pk) position, newest first, as unsaved ``Message``
+    instances.
+    """
+    blocks = MessageArchiveBlock.objects.filter(conversation=conversation).order_by(
+        "-first_created", "-first_id"
+    )
+    if before is not None:
+        created, pk = before
+        blocks = blocks.filter(Q(first_created__lt=created) | Q(first_created=created, first_id__lt=pk))
+    messages = []
+    while len(messages) < limit:
+        batch = list(blocks[:BLOCK_READ_BATCH])
+        for block in batch:
+            for msg in reversed(_read_block(block)):
+                if before is None or (msg.created, msg.pk) < before:
+                    messages.append(msg)
+            if len(messages) >= limit:
+                break
+        if len(batch) < BLOCK_READ_BATCH:
+            break
+        last = batch[-1]
+        blocks = blocks.filter(
+            Q(first_created__lt=last.first_created)
+            | Q(first_created=last.first_created, first_id__lt=last.first_id)
+        )
+    return messages[:limit]
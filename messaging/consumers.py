@@ -1,95 +1,246 @@
+import asyncio
 import json
+
+import msgpack
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from django.utils import timezone
 
+from profiles.graph import connection_graph
 from profiles.models import Profile
+from .drafts import draft_buffer
+from .frames import BINARY_SUBPROTOCOL, binary_frame, chat_broadcaster, chat_group
+from .ids import id_generator, next_message_id
+from .inbox import mark_read
+from .membership import membership
 from .models import Conversation, Message
+from .presence import presence, presence_group, presence_sweep
+from .typing import typing_payload, typing_tracker
+from .writer import message_writer
 
 
 class ChatConsumer(AsyncWebsocketConsumer):
+    """
+    Chat socket for one conversation. The sender's identity is resolved once
+    at connect; messages get their id on receipt, are broadcast immediately
+    and written behind by ``message_writer``, with an ack to the sender once
+    they are committed. Clients offering the ``BINARY_SUBPROTOCOL``
+    subprotocol exchange msgpack frames instead of JSON.
+    """
+
     async def connect(self):
         self.conversation_id = self.scope["url_route"]["kwargs"]["conversation_id"]
-        self.room_group_name = f"chat_{self.conversation_id}"
+        self.room_group_name = chat_group(self.conversation_id)
+        self.binary = BINARY_SUBPROTOCOL in self.scope.get("subprotocols", ())
         user = self.scope["user"]
         if not user.is_authenticated:
             await self.close()
             return
-        allowed = await self._is_participant(user.id, self.conversation_id)
-        if not allowed:
+        identity = await database_sync_to_async(membership.member)(user, self.conversation_id)
+        if identity is None:
             await self.close()
             return
+        self.profile_id, self.sender_name = identity
+        # lease the id worker slot now, so receive never waits on the cache
+        await database_sync_to_async(id_generator)()
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
-        await self.accept()
+        await self.accept(BINARY_SUBPROTOCOL if self.binary else None)
 
     async def disconnect(self, code):
         await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+        if getattr(self, "profile_id", None) is not None:
+            # messages already broadcast must not wait on a worker that may stop
+            await message_writer.flush()
+            await database_sync_to_async(draft_buffer.flush)()
 
     async def receive(self, text_data=None, bytes_data=None):
-        if not text_data:
+        if bytes_data:
+            data = msgpack.unpackb(bytes_data, raw=False)
+        elif text_data:
+            data = json.loads(text_data)
+        else:
             return
-        data = json.loads(text_data)
-        user = self.scope["user"]
-        if not user.is_authenticated:
+
+        # Draft autosave: {"draft": "<text>"}
+        if "draft" in data:
+            await database_sync_to_async(draft_buffer.save)(
+                self.profile_id, self.conversation_id, str(data.get("draft") or "")
+            )
             return
 
         # Typing indicator
         if "typing" in data:
-            sender_name = user.get_full_name() or user.username
             raw = data.get("typing")
             if isinstance(raw, bool):
                 is_typing = raw
             else:
                 val = str(raw).lower()
                 is_typing = val in ["1", "true", "yes", "on"]
-            await self._broadcast_typing(sender_name, is_typing)
+            await self._broadcast_typing(is_typing)
+            return
+
+        # Read receipt: {"read": <message id>} or {"read": true} for everything
+        if "read" in data:
+            raw = data.get("read")
+            message_id = raw if isinstance(raw, int) and not isinstance(raw, bool) else None
+            await self._mark_read(message_id)
             return
 
         # Chat message
         message = data.get("message", "").strip()
         if not message:
             return
-        msg_obj = await self._save_message(user.id, self.conversation_id, message)
+        msg = Message(
+            id=next_message_id(),
+            conversation_id=self.conversation_id,
+            sender_id=self.profile_id,
+            text=message,
+        )
         payload = {
             "kind": "message",
-            "sender": msg_obj["sender"],
-            "text": msg_obj["text"],
-            "timestamp": msg_obj["timestamp"],
+            "id": msg.pk,
+            "sender": self.sender_name,
+            "text": msg.text,
+            "timestamp": msg.created.strftime("%-I:%M %p"),
         }
-        await self.channel_layer.group_send(
-            self.room_group_name, {"type": "chat.message", "payload": payload}
-        )
+        await chat_broadcaster.send(self.room_group_name, payload)
+        asyncio.ensure_future(self._ack(message_writer.submit(msg), msg.pk))
+        # sending ends the sender's typing state
+        await self._broadcast_typing(False)
 
-    async def chat_message(self, event):
-        await self.send(text_data=json.dumps(event["payload"]))
+    async def chat_frames(self, event):
+        # don't echo typing state back to its own sender
+        keep = [i for i, sender in enumerate(event["senders"]) if sender != self.profile_id]
+        if not keep:
+            return
+        if self.binary:
+            frames = event["msgpack"]
+            await self.send(bytes_data=binary_frame([frames[i] for i in keep]))
+        else:
+            for i in keep:
+                await self.send(text_data=event["json"][i])
 
-    @database_sync_to_async
-    def _is_participant(self, user_id, conversation_id):
+    async def _send_payload(self, payload):
+        if self.binary:
+            await self.send(bytes_data=msgpack.packb(payload, use_bin_type=True))
+        else:
+            await self.send(text_data=json.dumps(payload))
+
+    async def _ack(self, saved, message_id):
+        ack = {"kind": "ack", "id": message_id}
         try:
-            conv = Conversation.objects.get(pk=conversation_id)
-        except Conversation.DoesNotExist:
-            return False
-        return conv.participants.filter(user_id=user_id).exists()
+            stored_id = await saved
+        except Exception:
+            ack["ok"] = False
+        else:
+            ack["ok"] = True
+            if stored_id != message_id:
+                # re-keyed after an id collision; the client renames its copy
+                ack["stored_id"] = stored_id
+        await self._send_payload(ack)
 
     @database_sync_to_async
-    def _save_message(self, user_id, conversation_id, text):
-        sender = Profile.objects.get(user_id=user_id)
-        conv = Conversation.objects.get(pk=conversation_id)
-        msg = Message.objects.create(conversation=conv, sender=sender, text=text)
-        conv.updated = timezone.now()
-        conv.save(update_fields=["updated"])
-        return {
-            "sender": sender.user.get_full_name() or sender.user.username,
-            "text": msg.text,
-            "timestamp": msg.created.strftime("%-I:%M %p"),
-        }
+    def _mark_read(self, message_id):
+        conv = Conversation.objects.only("last_message_id").get(pk=self.conversation_id)
+        mark_read(self.profile_id, conv, message_id)
 
-    async def _broadcast_typing(self, sender_name, is_typing):
-        payload = {
-            "kind": "typing",
-            "sender": sender_name,
-            "typing": is_typing,
-        }
-        await self.channel_layer.group_send(
-            self.room_group_name, {"type": "chat.message", "payload": payload}
+    async def _broadcast_typing(self, is_typing):
+        if typing_tracker.update(
+            self.conversation_id, self.profile_id, self.sender_name, is_typing
+        ):
+            await chat_broadcaster.send(
+                self.room_group_name,
+                typing_payload(self.sender_name, is_typing),
+                sender_id=self.profile_id,
+            )
+
+
+class PresenceConsumer(AsyncWebsocketConsumer):
+    """
+    Pushes online/offline transitions of the user's connections; nothing is
+    sent while states hold. The client heartbeats with {"heartbeat": true}
+    and sends {"available": false} when its tab is hidden. Each visible
+    socket counts towards its user's presence, so closing or hiding one tab
+    leaves the user online while another is still open. Expired heartbeats
+    reach the socket through ``presence_sweep``.
+    """
+
+    async def connect(self):
+        self.profile_id = None
+        self.counted = False
+        user = self.scope["user"]
+        if not user.is_authenticated:
+            await self.close()
+            return
+        self.profile_id, self.watching = await self._watch_list(user.id)
+        if self.profile_id is None:
+            await self.close()
+            return
+        await asyncio.gather(
+            *(
+                self.channel_layer.group_add(presence_group(pk), self.channel_name)
+                for pk in self.watching
+            )
+        )
+        await self.accept()
+        await self._attach()
+        states = await database_sync_to_async(presence.online)(self.watching)
+        self.states = dict(states)
+        await self.send(text_data=json.dumps({"kind": "snapshot", "states": states}))
+        presence_sweep.add(self)
+
+    async def disconnect(self, code):
+        if self.profile_id is None:
+            return
+        presence_sweep.discard(self)
+        await asyncio.gather(
+            *(
+                self.channel_layer.group_discard(presence_group(pk), self.channel_name)
+                for pk in self.watching
+            )
         )
+        await self._detach()
+
+    async def receive(self, text_data=None, bytes_data=None):
+        if bytes_data:
+            data = msgpack.unpackb(bytes_data, raw=False)
+        elif text_data:
+            data = json.loads(text_data)
+        else:
+            return
+        if data.get("available") is False:
+            await self._detach()
+        elif not self.counted and (data.get("heartbeat") or data.get("available")):
+            await self._attach()
+        elif data.get("heartbeat") or data.get("available"):
+            await database_sync_to_async(presence.heartbeat)(self.profile_id)
+
+    async def _attach(self):
+        self.counted = True
+        await database_sync_to_async(presence.connect)(self.profile_id)
+
+    async def _detach(self):
+        if self.counted:
+            self.counted = False
+            await database_sync_to_async(presence.disconnect)(self.profile_id)
+
+    async def presence_update(self, event):
+        await self._push(event["profile_id"], event["online"])
+
+    async def apply_states(self, states):
+        for profile_id in self.watching:
+            online = states.get(profile_id, False)
+            if self.states.get(profile_id) != online:
+                await self._push(profile_id, online)
+
+    async def _push(self, profile_id, online):
+        self.states[profile_id] = online
+        await self.send(
+            text_data=json.dumps({"kind": "presence", "profile_id": profile_id, "online": online})
+        )
+
+    @database_sync_to_async
+    def _watch_list(self, user_id):
+        profile_id = Profile.objects.filter(user_id=user_id).values_list("pk", flat=True).first()
+        if profile_id is None:
+            return None, []
+        return profile_id, connection_graph.neighbors(profile_id)
@@ -0,0 +1,115 @@
+import atexit
+import threading
+
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+
+from .models import MessageDraft
+
+DRAFT_CACHE_TTL = 24 * 3600
+
+
+def _key(profile_id, conversation_id):
+    return f"messaging:draft:{profile_id}:{conversation_id}"
+
+
+class DraftBuffer:
+    """
+    Write-behind store for message drafts. Saves land in the shared cache,
+    which readers check first, and the keys are marked dirty; dirty drafts
+    are written to ``MessageDraft`` at most every ``flush_interval`` seconds
+    (one upsert plus one delete for cleared drafts), on ``flush()`` and at
+    interpreter exit. The cache holds the latest text across workers, so a
+    flush persists that rather than this process's copy.
+    """
+
+    def __init__(self, flush_interval=5.0):
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._dirty = {}
+        self._timer = None
+
+    def save(self, profile_id, conversation_id, text):
+        text = (text or "").strip()
+        cache.set(_key(profile_id, conversation_id), text, DRAFT_CACHE_TTL)
+        with self._lock:
+            self._dirty[(profile_id, conversation_id)] = text
+            if self._timer is None:
+                self._start_timer()
+
+    def load(self, profile_id, conversation_id):
+        text = cache.get(_key(profile_id, conversation_id))
+        if text is None:
+            draft = MessageDraft.objects.filter(
+                profile_id=profile_id, conversation_id=conversation_id
+            ).first()
+            text = draft.text if draft else ""
+            cache.set(_key(profile_id, conversation_id), text, DRAFT_CACHE_TTL)
+        return text
+
+    def discard(self, pairs):
+        """
+        Clear buffered drafts for ``(profile_id, conversation_id)`` pairs whose
+        message was sent; their rows are deleted in the message's transaction.
+        """
+        pairs = set(pairs)
+        with self._lock:
+            for pair in pairs:
+                self._dirty.pop(pair, None)
+        # an empty draft rather than a missing key, so a flush already under
+        # way deletes the row instead of writing back its stale copy
+        cache.set_many({_key(*pair): "" for pair in pairs}, DRAFT_CACHE_TTL)
+
+    def _start_timer(self):
+        self._timer = threading.Timer(self.flush_interval, self._flush_from_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        finally:
+            close_old_connections()
+
+    def flush(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not dirty:
+            return
+        latest = cache.get_many([_key(*pair) for pair in dirty])
+        texts = {pair: latest.get(_key(*pair), text) for pair, text in dirty.items()}
+        keep = [
+            MessageDraft(profile_id=profile_id, conversation_id=conversation_id, text=text)
+            for (profile_id, conversation_id), text in texts.items()
+            if text
+        ]
+        cleared = Q(pk__in=[])
+        for (profile_id, conversation_id), text in texts.items():
+            if not text:
+                cleared |= Q(profile_id=profile_id, conversation_id=conversation_id)
+        try:
+            with transaction.atomic():
+                if keep:
+                    MessageDraft.objects.bulk_create(
+                        keep,
+                        update_conflicts=True,
+                        unique_fields=["profile", "conversation"],
+                        update_fields=["text", "updated"],
+                    )
+                MessageDraft.objects.filter(cleared).delete()
+        except Exception:
+            # keep them dirty so the next flush retries
+            with self._lock:
+                for pair, text in dirty.items():
+                    self._dirty.setdefault(pair, text)
+                if self._timer is None:
+                    self._start_timer()
+            raise
+
+
+draft_buffer = DraftBuffer()
+atexit.register(draft_buffer.flush)
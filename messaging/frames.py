@@ -0,0 +1,123 @@
+"""
+Chat fan-out frames.
+
+A chat event is encoded once, when it is broadcast, as both a JSON text
+frame and a msgpack binary frame; each socket then forwards whichever its
+wire mode uses without serializing anything. Sockets that open with the
+``BINARY_SUBPROTOCOL`` subprotocol get msgpack, and any events for the room
+that arrive together share one frame (a msgpack array). Everyone else keeps
+getting one JSON object per text frame, as before.
+"""
+import asyncio
+import json
+import logging
+import threading
+
+import msgpack
+from channels.layers import get_channel_layer
+
+logger = logging.getLogger(__name__)
+
+BINARY_SUBPROTOCOL = "connectpro.msgpack"
+
+
+def chat_group(conversation_id):
+    return f"chat_{conversation_id}"
+
+
+def encode(payload):
+    return json.dumps(payload), msgpack.packb(payload, use_bin_type=True)
+
+
+def binary_frame(items):
+    """
+    One pre-encoded msgpack item as is, several as a msgpack array of them.
+    """
+    if len(items) == 1:
+        return items[0]
+    n = len(items)
+    if n < 16:
+        header = bytes([0x90 | n])
+    elif n < 1 << 16:
+        header = b"\xdc" + n.to_bytes(2, "big")
+    else:
+        header = b"\xdd" + n.to_bytes(4, "big")
+    return header + b"".join(items)
+
+
+def _log_failure(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("chat broadcast failed", exc_info=future.exception())
+
+
+class ChatBroadcaster:
+    """
+    Sends chat events to a room as ``chat.frames`` group messages carrying
+    the pre-encoded frames. Events for the same room sent during one pass of
+    the event loop (many senders at once, under load) go out as a single
+    group message; when idle an event goes out on the next pass. The first
+    sender for a room waits for the send, later ones just join it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._home = None
+        self._loop = None
+        self._tasks = set()
+
+    async def send(self, group, payload, sender_id=None):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._home = loop
+        text, binary = encode(payload)
+        with self._lock:
+            pending = self._pending.get(group)
+            if pending is not None:
+                pending.append((sender_id, text, binary))
+                return
+            self._pending[group] = pending = [(sender_id, text, binary)]
+        try:
+            # let other senders that are ready in this pass join the frame
+            await asyncio.sleep(0)
+        finally:
+            # even if cancelled, or later sends to the room would queue behind it forever
+            with self._lock:
+                del self._pending[group]
+        senders, texts, binaries = (list(column) for column in zip(*pending))
+        await get_channel_layer().group_send(
+            group,
+            {"type": "chat.frames", "senders": senders, "json": texts, "msgpack": binaries},
+        )
+
+    def publish(self, group, payload, sender_id=None):
+        """
+        ``send`` without waiting for the channel layer: the send is scheduled
+        and the caller returns at once. On an event loop it becomes a task of
+        that loop; from a plain thread (a timer, a sync view) it goes to the
+        loop of the last send, where the server's sockets live, or outside
+        ASGI to a background loop. Failures are logged.
+        """
+        send = self.send(group, payload, sender_id)
+        try:
+            task = asyncio.get_running_loop().create_task(send)
+        except RuntimeError:
+            home = self._home
+            loop = home if home is not None and home.is_running() else self._background_loop()
+            task = asyncio.run_coroutine_threadsafe(send, loop)
+        # the loop only holds weak references to its tasks
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        task.add_done_callback(_log_failure)
+
+    def _background_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=self._loop.run_forever, name="chat-broadcast", daemon=True
+                ).start()
+            return self._loop
+
+
+chat_broadcaster = ChatBroadcaster()
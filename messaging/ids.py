@@ -0,0 +1,144 @@
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+# 41 bits of milliseconds since EPOCH_MS, 6 bits of worker, 6 bits of
+# sequence: 53 bits in total, so ids survive a round trip through JavaScript.
+EPOCH_MS = 1_735_689_600_000  # 2025-01-01T00:00:00Z
+WORKER_BITS = 6
+SEQUENCE_BITS = 6
+WORKER_MASK = (1 << WORKER_BITS) - 1
+SEQUENCE_MASK = (1 << SEQUENCE_BITS) - 1
+WORKER_SLOT_KEY = "messaging:id_worker:{}"
+WORKER_LEASE_TTL = 60
+
+
+class MessageIdGenerator:
+    """
+    Time-ordered message ids assigned by the server, so a chat message can be
+    broadcast under its final primary key before it is written. Ids never go
+    backwards within a process: a clock step back or a full millisecond
+    borrows from the next one.
+    """
+
+    def __init__(self, worker_id):
+        self.worker_id = worker_id & WORKER_MASK
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._sequence = 0
+
+    def set_worker_id(self, worker_id):
+        with self._lock:
+            self.worker_id = worker_id & WORKER_MASK
+
+    def next_id(self):
+        with self._lock:
+            now = max(int(time.time() * 1000) - EPOCH_MS, self._last_ms)
+            if now == self._last_ms:
+                self._sequence = (self._sequence + 1) & SEQUENCE_MASK
+                if self._sequence == 0:
+                    now += 1
+            else:
+                self._sequence = 0
+            self._last_ms = now
+            return (
+                (now << (WORKER_BITS + SEQUENCE_BITS))
+                | (self.worker_id << SEQUENCE_BITS)
+                | self._sequence
+            )
+
+
+class WorkerLease:
+    """
+    Holds one of the ``1 << WORKER_BITS`` worker slots as an expiring key in
+    the shared cache (claimed with ``add``, so two live processes never hold
+    the same slot) and renews it from a background timer. If the lease is
+    lost anyway, e.g. the process stalled past ``ttl``, the next renewal
+    claims a fresh slot and moves the generator to it.
+    """
+
+    def __init__(self, ttl=WORKER_LEASE_TTL):
+        self.ttl = ttl
+        self.slot = None
+        self._token = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+        self._on_change = None
+
+    def _key(self, slot):
+        return WORKER_SLOT_KEY.format(slot)
+
+    def acquire(self):
+        start = random.randrange(1 << WORKER_BITS)
+        for i in range(1 << WORKER_BITS):
+            slot = (start + i) & WORKER_MASK
+            if cache.add(self._key(slot), self._token, self.ttl):
+                self.slot = slot
+                return slot
+        raise RuntimeError(
+            f"all {1 << WORKER_BITS} message id worker slots are leased; "
+            "set MESSAGE_WORKER_ID or run fewer workers"
+        )
+
+    def start(self, on_change):
+        self._on_change = on_change
+        self._schedule()
+
+    def _schedule(self):
+        timer = threading.Timer(self.ttl / 3, self._renew)
+        timer.daemon = True
+        timer.start()
+
+    def _renew(self):
+        try:
+            key = self._key(self.slot)
+            if cache.get(key) == self._token and cache.touch(key, self.ttl):
+                return
+            self._on_change(self.acquire())
+        except Exception:
+            # the cache is unreachable: keep the slot and retry on the next tick
+            pass
+        finally:
+            self._schedule()
+
+
+def _worker_id():
+    """
+    ``settings.MESSAGE_WORKER_ID`` when set, which must then be unique per
+    running process; otherwise a slot leased from the shared cache.
+    """
+    configured = getattr(settings, "MESSAGE_WORKER_ID", None)
+    if configured is not None:
+        return int(configured), None
+    lease = WorkerLease()
+    return lease.acquire(), lease
+
+
+_generator = None
+_generator_lock = threading.Lock()
+
+
+def id_generator():
+    """
+    The process's generator, created (and its worker slot leased) on first
+    use. That touches the cache, so async code calls this from a thread
+    before its first ``next_message_id``.
+    """
+    global _generator
+    if _generator is None:
+        with _generator_lock:
+            if _generator is None:
+                worker_id, lease = _worker_id()
+                generator = MessageIdGenerator(worker_id)
+                if lease is not None:
+                    lease.start(generator.set_worker_id)
+                _generator = generator
+    return _generator
+
+
+def next_message_id():
+    return id_generator().next_id()
@@ -0,0 +1,311 @@
+from bisect import bisect_right
+from datetime import datetime
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest, Substr
+
+from profiles.graph import connection_graph
+from profiles.models import Profile, ordered_pair
+from .archive import read_archive
+from .drafts import draft_buffer
+from .ids import next_message_id
+from .models import (
+    PREVIEW_LENGTH,
+    Conversation,
+    Message,
+    MessageArchiveBlock,
+    MessageDraft,
+    Participant,
+)
+from .search import search_index
+
+HISTORY_PAGE_SIZE = 30
+ID_RETRIES = 3
+
+
+def conversations_with(me, other_ids):
+    """
+    Map each of ``other_ids`` to ``me``'s conversation with them in one query,
+    most recently active first, with ``me``'s ``unread_count`` attached. The
+    other profile is read off the conversation's canonical pair.
+    """
+    other_ids = list(other_ids)
+    rows = (
+        Participant.objects.filter(profile=me)
+        .filter(
+            Q(conversation__pair_low_id=me.pk, conversation__pair_high_id__in=other_ids)
+            | Q(conversation__pair_high_id=me.pk, conversation__pair_low_id__in=other_ids)
+        )
+        .select_related("conversation")
+        .order_by("-last_activity", "-conversation_id")
+    )
+    convs = {}
+    for row in rows:
+        conv = row.conversation
+        conv.unread_count = row.unread_count
+        convs[conv.pair_low_id + conv.pair_high_id - me.pk] = conv
+    return convs
+
+
+def inbox_threads(me):
+    """
+    One thread per accepted connection, most recent activity first, in two
+    queries: ``me``'s participant rows walked in ``participant_inbox_idx``
+    order with the conversation summary joined, and the connected profiles.
+    Connections without a conversation yet are listed last with ``conv`` set
+    to None; ``open_conversation`` creates it when the thread is opened.
+    """
+    neighbors = connection_graph.neighbors(me.pk)
+    convs = conversations_with(me, neighbors)
+    others = Profile.objects.select_related("user").in_bulk(neighbors)
+    threads = [{"conv": conv, "other": others[pk]} for pk, conv in convs.items() if pk in others]
+    unstarted = [
+        {"conv": None, "other": other} for pk, other in others.items() if pk not in convs
+    ]
+    unstarted.sort(key=lambda t: t["other"].user.get_full_name() or t["other"].user.username)
+    return threads + unstarted
+
+
+def open_conversation(me, other):
+    """
+    Return ``me``'s conversation with ``other``, creating it on first use.
+    Concurrent first opens meet on the unique pair index: one inserts, the
+    others get its row.
+    """
+    conv = Conversation.objects.between(me, other).first()
+    if conv is not None:
+        return conv
+    low, high = ordered_pair(me, other)
+    with transaction.atomic():
+        conv, created = Conversation.objects.get_or_create(pair_low_id=low, pair_high_id=high)
+        if created:
+            conv.participants.add(me, other)
+    return conv
+
+
+def post_message(conversation_id, sender, text):
+    """
+    Store a message under a server-assigned id and fold it into the
+    conversation summary and each participant's inbox position.
+    """
+    msg = Message(
+        id=next_message_id(), conversation_id=conversation_id, sender=sender, text=text
+    )
+    persist_messages([msg])
+    return msg
+
+
+def persist_messages(messages):
+    """
+    Write ``messages`` (ids already assigned, in send order) with one INSERT,
+    update the summaries of the conversations they belong to and drop the
+    senders' drafts, all in one transaction, then add them to the search
+    index. Messages whose ids collide with stored ones are given new ids and
+    retried; callers read the final ids back from the instances. Used
+    directly by the HTTP send path and in batches by the chat write-behind
+    buffer.
+    """
+    by_conversation = {}
+    for msg in messages:
+        by_conversation.setdefault(msg.conversation_id, []).append(msg)
+    sent_from = {(msg.sender_id, msg.conversation_id) for msg in messages}
+    drafts = Q(pk__in=[])
+    for profile_id, conversation_id in sent_from:
+        drafts |= Q(profile_id=profile_id, conversation_id=conversation_id)
+    for attempt in range(ID_RETRIES):
+        try:
+            with transaction.atomic():
+                Message.objects.bulk_create(messages)
+                for conversation_id, batch in by_conversation.items():
+                    _apply_summary(conversation_id, batch)
+                # a sent message consumes its sender's draft
+                MessageDraft.objects.filter(drafts).delete()
+                transaction.on_commit(lambda: draft_buffer.discard(sent_from))
+                transaction.on_commit(lambda: search_index.add(messages))
+            return
+        except IntegrityError:
+            ids = [msg.pk for msg in messages]
+            if attempt == ID_RETRIES - 1 or not Message.objects.filter(pk__in=ids).exists():
+                raise
+            # another worker produced the same ids (a shared or lost worker
+            # slot): give the batch fresh ones rather than lose it
+            for msg in messages:
+                msg.id = next_message_id()
+
+
+def _apply_summary(conversation_id, batch):
+    last = batch[-1]
+    Conversation.objects.filter(pk=conversation_id).update(
+        message_count=F("message_count") + len(batch), updated=last.created
+    )
+    # a concurrent, later message may already have committed its summary
+    Conversation.objects.filter(pk=conversation_id).filter(
+        Q(last_message_at__isnull=True) | Q(last_message_at__lte=last.created)
+    ).update(
+        last_message_id=last.pk,
+        last_message_preview=last.text[:PREVIEW_LENGTH],
+        last_sender_id=last.sender_id,
+        last_message_at=last.created,
+    )
+    # Senders have read up to their own last message. Everyone else gains the
+    # messages past their watermark, which a read frame may already have moved
+    # into this batch before it was written.
+    ids = [msg.pk for msg in batch]
+    last_sent = {msg.sender_id: i for i, msg in enumerate(batch)}
+    members = Participant.objects.select_for_update().filter(conversation_id=conversation_id)
+    unread, watermark = [], []
+    for profile_id, read_upto in members.values_list("profile_id", "last_read_message_id"):
+        seen = bisect_right(ids, read_upto or 0)
+        if profile_id in last_sent:
+            i = last_sent[profile_id]
+            unread.append(When(profile_id=profile_id, then=Value(len(batch) - max(seen, i + 1))))
+            watermark.append(When(profile_id=profile_id, then=Value(max(read_upto or 0, ids[i]))))
+        else:
+            unread.append(
+                When(profile_id=profile_id, then=F("unread_count") + (len(batch) - seen))
+            )
+    Participant.objects.filter(conversation_id=conversation_id).update(
+        last_activity=Greatest("last_activity", Value(last.created)),
+        unread_count=Case(
+            *unread, default=F("unread_count"), output_field=models.PositiveIntegerField()
+        ),
+        last_read_message_id=Case(
+            *watermark, default=F("last_read_message_id"), output_field=models.BigIntegerField()
+        ),
+    )
+
+
+def mark_read(profile_id, conversation, message_id=None):
+    """
+    Move the profile's read watermark up to ``message_id`` (the latest message
+    when None) and recount what remains unread. Reading to the end is a single
+    UPDATE; a partial read counts the messages past the new watermark.
+    ``message_id`` may name a message still waiting in the write-behind
+    buffer. Watermarks never move backwards.
+    """
+    latest = conversation.last_message_id
+    rows = Participant.objects.filter(conversation_id=conversation.pk, profile_id=profile_id)
+    if message_id is None:
+        if latest is not None:
+            rows.filter(unread_count__gt=0).update(last_read_message_id=latest, unread_count=0)
+        return 0
+    behind = Q(last_read_message_id__isnull=True) | Q(last_read_message_id__lt=message_id)
+    if latest is None or message_id >= latest:
+        rows.filter(behind).update(last_read_message_id=message_id, unread_count=0)
+        return 0
+    remaining = (
+        Message.objects.filter(conversation_id=conversation.pk, pk__gt=message_id)
+        .exclude(sender_id=profile_id)
+        .count()
+    )
+    moved = rows.filter(behind).update(last_read_message_id=message_id, unread_count=remaining)
+    if not moved:
+        return rows.values_list("unread_count", flat=True).first() or 0
+    return remaining
+
+
+def rebuild_summaries(conversation_ids=None):
+    """
+    Recompute conversation summaries, participant activity and unread counts
+    from ``messaging_message`` with two set-based UPDATEs; for backfills and
+    for repairing drift. Archived messages still count towards
+    ``message_count`` but are treated as read, and a conversation whose whole
+    history is archived keeps its last-message summary. Returns the number of
+    conversations rewritten.
+    """
+    conversations = Conversation.objects.all()
+    participants = Participant.objects.all()
+    if conversation_ids is not None:
+        conversations = conversations.filter(pk__in=conversation_ids)
+        participants = participants.filter(conversation_id__in=conversation_ids)
+    latest = Message.objects.filter(conversation=OuterRef("pk")).order_by("-created", "-pk")
+    counts = (
+        Message.objects.filter(conversation=OuterRef("pk"))
+        .order_by()
+        .values("conversation")
+        .annotate(n=Count("pk"))
+        .values("n")
+    )
+    archived = (
+        MessageArchiveBlock.objects.filter(conversation=OuterRef("pk"))
+        .order_by()
+        .values("conversation")
+        .annotate(n=Sum("message_count"))
+        .values("n")
+    )
+
+    def kept(field):
+        return Case(When(archived_through__isnull=False, then=F(field)))
+
+    with transaction.atomic():
+        rewritten = conversations.update(
+            last_message_id=Coalesce(Subquery(latest.values("pk")[:1]), kept("last_message_id")),
+            last_message_preview=Coalesce(
+                Subquery(
+                    latest.annotate(preview=Substr("text", 1, PREVIEW_LENGTH)).values("preview")[:1]
+                ),
+                kept("last_message_preview"),
+                Value(""),
+            ),
+            last_sender_id=Coalesce(Subquery(latest.values("sender_id")[:1]), kept("last_sender_id")),
+            last_message_at=Coalesce(Subquery(latest.values("created")[:1]), kept("last_message_at")),
+            message_count=Coalesce(Subquery(counts), 0)
+            + Coalesce(Subquery(archived), 0, output_field=models.IntegerField()),
+        )
+        activity = Conversation.objects.filter(pk=OuterRef("conversation_id")).annotate(
+            activity=Coalesce("last_message_at", "created")
+        )
+        unread = (
+            Message.objects.filter(
+                conversation=OuterRef("conversation_id"),
+                pk__gt=Coalesce(OuterRef("last_read_message_id"), 0),
+            )
+            .exclude(sender=OuterRef("profile_id"))
+            .order_by()
+            .values("conversation")
+            .annotate(n=Count("pk"))
+            .values("n")
+        )
+        participants.update(
+            last_activity=Subquery(activity.values("activity")[:1]),
+            unread_count=Coalesce(Subquery(unread), 0),
+        )
+    return rewritten
+
+
+def parse_history_cursor(raw):
+    """
+    Cursors are ``"<created isoformat>|<pk>"`` of the oldest message shown.
+    """
+    try:
+        created, pk = str(raw).rsplit("|", 1)
+        return datetime.fromisoformat(created), int(pk)
+    except (TypeError, ValueError):
+        return None
+
+
+def history_page(conversation, before=None, page_size=HISTORY_PAGE_SIZE):
+    """
+    The ``page_size`` messages preceding the ``before`` cursor (the latest
+    ones when None), oldest first, plus the cursor for the page before that.
+    Seeks on ``message_history_idx`` so cost doesn't grow with history length,
+    and continues into the archive once the hot table runs out.
+    """
+    rows = Message.objects.filter(conversation=conversation)
+    cursor = parse_history_cursor(before) if before else None
+    if cursor:
+        created, pk = cursor
+        rows = rows.filter(Q(created__lt=created) | Q(created=created, pk__lt=pk))
+    rows = list(rows.order_by("-created", "-pk")[: page_size + 1])
+    if len(rows) <= page_size and conversation.archived_through is not None:
+        # hot history is used up: carry on into the archive
+        boundary = (rows[-1].created, rows[-1].pk) if rows else cursor
+        rows += read_archive(conversation, boundary, page_size + 1 - len(rows))
+    older_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        oldest = rows[-1]
+        older_cursor = f"{oldest.created.isoformat()}|{oldest.pk}"
+    rows.reverse()
+    return rows, older_cursor
@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from messaging.archive import archive_range
+from messaging.inbox import rebuild_summaries
+from messaging.models import Message
+
+SUMMARY_BATCH = 1000
+
+
+def _month_start(moment):
+    return datetime(moment.year, moment.month, 1, tzinfo=dt_timezone.utc)
+
+
+def _next_month(start):
+    return start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+
+
+class Command(BaseCommand):
+    help = (
+        "Move whole (UTC) months of messages older than --older-than days out of "
+        "messaging_message into compressed, seekable archive segments. History "
+        "pages read them back transparently."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than",
+            type=int,
+            default=settings.MESSAGE_HOT_DAYS,
+            help="Keep this many days of messages hot (default: MESSAGE_HOT_DAYS).",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Report what would move without moving it."
+        )
+
+    def handle(self, *args, **options):
+        cutoff = _month_start(timezone.now() - timedelta(days=options["older_than"]))
+        oldest = Message.objects.order_by("created").values_list("created", flat=True).first()
+        if oldest is None or oldest >= cutoff:
+            self.stdout.write("Nothing to archive.")
+            return
+        total = 0
+        month = _month_start(oldest)
+        while month < cutoff:
+            end = _next_month(month)
+            segment = f"messages-{month:%Y-%m}.jsonl.gz"
+            if options["dry_run"]:
+                count = Message.objects.filter(created__gte=month, created__lt=end).count()
+                self.stdout.write(f"{month:%Y-%m}: {count} messages")
+            else:
+                count, conversation_ids = archive_range(month, end, segment)
+                # archived messages no longer count as unread
+                for i in range(0, len(conversation_ids), SUMMARY_BATCH):
+                    rebuild_summaries(conversation_ids[i : i + SUMMARY_BATCH])
+                if count:
+                    self.stdout.write(
+                        f"{month:%Y-%m}: archived {count} messages "
+                        f"from {len(conversation_ids)} conversations"
+                    )
+            total += count
+            month = end
+        verb = "Would archive" if options["dry_run"] else "Archived"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {total} messages older than {cutoff:%Y-%m-%d}."))
@@ -0,0 +1,115 @@
+import asyncio
+import multiprocessing
+import statistics
+import tempfile
+import time
+
+from channels.layers import InMemoryChannelLayer
+from django.core.management.base import BaseCommand
+
+from network_platform.channel_layers import UnixSocketChannelLayer
+
+BENCH_GROUP = "bench_channel_layer"
+
+
+async def _echo_peer(layer, ready):
+    """
+    Join the bench group, report the channel name and answer the driver:
+    pong each ping, and say when the whole burst has arrived.
+    """
+    channel = await layer.new_channel()
+    await layer.group_add(BENCH_GROUP, channel)
+    ready(channel)
+    received = 0
+    while True:
+        message = await layer.receive(channel)
+        if message["type"] == "bench.ping":
+            await layer.send(message["reply_to"], {"type": "bench.pong"})
+        elif message["type"] == "bench.burst":
+            received += 1
+            if received == message["total"]:
+                received = 0
+                await layer.send(message["reply_to"], {"type": "bench.done"})
+        else:
+            return
+
+
+async def _drive(layer, peer_channel, pings, messages):
+    me = await layer.new_channel()
+    samples = []
+    for _ in range(pings):
+        start = time.perf_counter()
+        await layer.send(peer_channel, {"type": "bench.ping", "reply_to": me})
+        await layer.receive(me)
+        samples.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    for i in range(messages):
+        await layer.group_send(
+            BENCH_GROUP,
+            {"type": "bench.burst", "total": messages, "reply_to": me, "text": f"message {i}"},
+        )
+    await layer.receive(me)
+    elapsed = time.perf_counter() - start
+    await layer.send(peer_channel, {"type": "bench.stop"})
+    return samples, elapsed
+
+
+def _run_peer(path, capacity, conn):
+    layer = UnixSocketChannelLayer(path=path, capacity=capacity)
+    asyncio.run(_echo_peer(layer, conn.send))
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the channel layers: round-trip latency of a direct send and "
+        "throughput of a group send, for InMemoryChannelLayer within one process "
+        "and UnixSocketChannelLayer between two processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pings", type=int, default=2000)
+        parser.add_argument("--messages", type=int, default=20000)
+
+    def handle(self, *args, **options):
+        pings, messages = options["pings"], options["messages"]
+        # room for the whole burst, so neither layer drops messages
+        capacity = messages + 10
+        self._report("in-memory, one process", asyncio.run(self._in_memory(capacity, options)), messages)
+        self._report("unix socket, two processes", self._unix_socket(capacity, options), messages)
+
+    async def _in_memory(self, capacity, options):
+        layer = InMemoryChannelLayer(capacity=capacity)
+        ready = asyncio.get_running_loop().create_future()
+        peer = asyncio.create_task(_echo_peer(layer, ready.set_result))
+        result = await _drive(layer, await ready, options["pings"], options["messages"])
+        await peer
+        return result
+
+    def _unix_socket(self, capacity, options):
+        with tempfile.TemporaryDirectory() as path:
+            context = multiprocessing.get_context("fork")
+            parent_conn, child_conn = context.Pipe()
+            peer = context.Process(target=_run_peer, args=(path, capacity, child_conn))
+            peer.start()
+            try:
+                peer_channel = parent_conn.recv()
+                layer = UnixSocketChannelLayer(path=path, capacity=capacity)
+                result = asyncio.run(_drive(layer, peer_channel, options["pings"], options["messages"]))
+                asyncio.run(layer.close())
+            finally:
+                peer.join(timeout=5)
+                if peer.is_alive():
+                    peer.terminate()
+            return result
+
+    def _report(self, label, result, messages):
+        samples, elapsed = result
+        samples = sorted(sample * 1e6 for sample in samples)
+        p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+        self.stdout.write(label)
+        self.stdout.write(
+            f"  round trip: p50 {statistics.median(samples):8.1f} us   p99 {p99:8.1f} us"
+        )
+        self.stdout.write(
+            f"  group send: {messages / elapsed:10.0f} msg/s  ({elapsed:.2f} s for {messages})"
+        )
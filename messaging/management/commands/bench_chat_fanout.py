@@ -0,0 +1,114 @@
+import asyncio
+import json
+import time
+
+from channels.layers import InMemoryChannelLayer, channel_layers
+from django.core.management.base import BaseCommand
+
+from messaging.consumers import ChatConsumer
+from messaging.frames import chat_broadcaster, chat_group
+
+ROOM = 1
+
+
+class PerRecipientConsumer(ChatConsumer):
+    """
+    The previous fan-out: the payload dict travels through the layer and
+    every socket serializes it again.
+    """
+
+    async def chat_message(self, event):
+        if event.get("sender_id") == self.profile_id:
+            return
+        await self.send(text_data=json.dumps(event["payload"]))
+
+
+class Sink:
+    def __init__(self):
+        self.frames = 0
+
+    async def __call__(self, message):
+        self.frames += 1
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark chat fan-out CPU per delivered message (process time, in-memory "
+        "layer): per-recipient json.dumps versus frames encoded once at send time, "
+        "as JSON text and as batched msgpack."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rooms", default="2,50,500")
+        parser.add_argument("--messages", type=int, default=200)
+        parser.add_argument("--senders", type=int, default=10)
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options["rooms"].split(",")]
+        self.stdout.write(
+            f"{options['messages']} messages from {options['senders']} concurrent senders per room"
+        )
+        self.stdout.write(f"{'sockets':>8} {'mode':<16} {'us/delivery':>12} {'frames':>9}")
+        for size in sizes:
+            for mode in ("per-recipient", "json", "msgpack"):
+                cpu, frames, delivered = asyncio.run(self._run(size, mode, options))
+                self.stdout.write(
+                    f"{size:>8} {mode:<16} {cpu / delivered * 1e6:>12.2f} {frames:>9}"
+                )
+
+    async def _run(self, size, mode, options):
+        total = options["messages"]
+        layer = InMemoryChannelLayer(capacity=total + 10)
+        channel_layers.backends["default"] = layer
+        group = chat_group(ROOM)
+        consumer_class = PerRecipientConsumer if mode == "per-recipient" else ChatConsumer
+        sinks, consumers = [], []
+        for i in range(size):
+            consumer = consumer_class()
+            consumer.channel_layer = layer
+            consumer.channel_name = await layer.new_channel()
+            consumer.profile_id = i + 1
+            consumer.binary = mode == "msgpack"
+            consumer.base_send = Sink()
+            await layer.group_add(group, consumer.channel_name)
+            sinks.append(consumer.base_send)
+            consumers.append(consumer)
+
+        expected = total * size
+        delivered = 0
+        done = asyncio.Event()
+
+        async def socket(consumer):
+            nonlocal delivered
+            while True:
+                event = await layer.receive(consumer.channel_name)
+                await consumer.dispatch(event)
+                delivered += len(event.get("senders", (None,)))
+                if delivered >= expected:
+                    done.set()
+
+        async def sender(count):
+            for i in range(count):
+                payload = {
+                    "kind": "message",
+                    "id": i,
+                    "sender": "Bench",
+                    "text": f"message {i}",
+                    "timestamp": "1:00 PM",
+                }
+                if mode == "per-recipient":
+                    await layer.group_send(group, {"type": "chat.message", "payload": payload})
+                else:
+                    await chat_broadcaster.send(group, payload)
+                await asyncio.sleep(0)
+
+        tasks = [asyncio.create_task(socket(consumer)) for consumer in consumers]
+        share, extra = divmod(total, options["senders"])
+        start = time.process_time()
+        await asyncio.gather(*(sender(share + (i < extra)) for i in range(options["senders"])))
+        await done.wait()
+        cpu = time.process_time() - start
+        for task in tasks:
+            task.cancel()
+        channel_layers.backends.pop("default", None)
+        return cpu, sum(sink.frames for sink in sinks), expected
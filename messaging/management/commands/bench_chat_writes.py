@@ -0,0 +1,95 @@
+import asyncio
+import time
+import uuid
+
+from channels.db import database_sync_to_async
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from messaging.ids import next_message_id
+from messaging.models import Conversation, Message
+from messaging.writer import MessageWriter
+from profiles.models import Profile
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark chat message persistence on one worker (messages/second): the "
+        "original one INSERT per frame versus the batched write-behind buffer, "
+        "which also keeps summaries and unread counts. Writes to the configured "
+        "database and removes its rows afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=2000)
+        parser.add_argument("--senders", type=int, default=20)
+        parser.add_argument("--batch", type=int, default=200)
+        parser.add_argument("--interval", type=float, default=0.05)
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        users = [User.objects.create_user(f"bench-{tag}-{i}") for i in range(2)]
+        profiles = [Profile.objects.create(user=user) for user in users]
+        conv = Conversation.objects.create()
+        conv.participants.add(*profiles)
+        try:
+            per_message = asyncio.run(self._per_message(conv, users[0].pk, options))
+            write_behind = asyncio.run(self._write_behind(conv, profiles[0].pk, options))
+        finally:
+            conv.delete()
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+        n = options["messages"]
+        self.stdout.write(
+            f"{n} messages from {options['senders']} concurrent senders "
+            f"(batch {options['batch']}, {options['interval'] * 1000:.0f} ms window)"
+        )
+        self.stdout.write(f"  per-message:  {n / per_message:10.0f} msg/s  ({per_message:.2f} s)")
+        self.stdout.write(f"  write-behind: {n / write_behind:10.0f} msg/s  ({write_behind:.2f} s)")
+
+    async def _per_message(self, conv, user_id, options):
+        @database_sync_to_async
+        def save(text):
+            # what ChatConsumer._save_message did for every frame (the id is
+            # the only addition, so both runs write the same kind of row)
+            sender = Profile.objects.get(user_id=user_id)
+            conversation = Conversation.objects.get(pk=conv.pk)
+            Message.objects.create(
+                id=next_message_id(), conversation=conversation, sender=sender, text=text
+            )
+            conversation.updated = timezone.now()
+            conversation.save(update_fields=["updated"])
+
+        async def sender(count):
+            for i in range(count):
+                await save(f"message {i}")
+
+        return await self._timed(sender, options)
+
+    async def _write_behind(self, conv, profile_id, options):
+        writer = MessageWriter(max_batch=options["batch"], flush_interval=options["interval"])
+        acks = []
+
+        async def sender(count):
+            for i in range(count):
+                msg = Message(
+                    id=next_message_id(),
+                    conversation_id=conv.pk,
+                    sender_id=profile_id,
+                    text=f"message {i}",
+                )
+                acks.append(writer.submit(msg))
+                # a consumer hands control back to the event loop between frames
+                await asyncio.sleep(0)
+
+        elapsed = await self._timed(sender, options)
+        start = time.perf_counter()
+        await asyncio.gather(*acks)
+        return elapsed + (time.perf_counter() - start)
+
+    async def _timed(self, sender, options):
+        senders = options["senders"]
+        share, extra = divmod(options["messages"], senders)
+        start = time.perf_counter()
+        await asyncio.gather(*(sender(share + (i < extra)) for i in range(senders)))
+        return time.perf_counter() - start
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from messaging.inbox import rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = "Recompute denormalized conversation summaries and inbox ordering from messages."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "conversation_ids",
+            nargs="*",
+            type=int,
+            help="Only rebuild these conversations (default: all).",
+        )
+
+    def handle(self, *args, **options):
+        ids = options["conversation_ids"] or None
+        rewritten = rebuild_summaries(ids)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rewritten} conversation summaries."))
@@ -0,0 +1,97 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+from .models import Participant
+
+MEMBERSHIP_VERSION_KEY = "messaging:membership_version:{}"
+
+
+def _version_key(conversation_id):
+    return MEMBERSHIP_VERSION_KEY.format(conversation_id)
+
+
+class MembershipCache:
+    """
+    Conversation id -> its participants (user id -> profile id and display
+    name), in process memory as an LRU of at most ``max_size`` conversations,
+    so checking that a user belongs to a conversation is a dict lookup.
+    Participant changes bump a per-conversation version in the shared cache
+    and drop the local entry; other workers compare an entry against that
+    version once it is ``recheck`` seconds old, and reload it if it moved.
+    """
+
+    def __init__(self, max_size=10000, recheck=5.0):
+        self.max_size = max_size
+        self.recheck = recheck
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def _load(self, conversation_id):
+        rows = Participant.objects.filter(conversation_id=conversation_id).values_list(
+            "profile_id",
+            "profile__user_id",
+            "profile__user__first_name",
+            "profile__user__last_name",
+            "profile__user__username",
+        )
+        return {
+            user_id: (profile_id, f"{first} {last}".strip() or username)
+            for profile_id, user_id, first, last, username in rows
+        }
+
+    def members(self, conversation_id):
+        """
+        ``{user id: (profile id, display name)}`` for the conversation; empty
+        when it has no participants or doesn't exist.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is not None:
+                self._entries.move_to_end(conversation_id)
+        if entry is not None:
+            members, version, checked = entry
+            if now - checked < self.recheck:
+                return members
+            if cache.get(_version_key(conversation_id)) == version:
+                with self._lock:
+                    if self._entries.get(conversation_id) is entry:
+                        self._entries[conversation_id] = (members, version, now)
+                return members
+        # read the version first, so a change racing the load leaves it stale
+        version = cache.get(_version_key(conversation_id))
+        members = self._load(conversation_id)
+        if not members:
+            # unknown ids aren't cached, so probing them can't evict real entries
+            return members
+        with self._lock:
+            self._entries[conversation_id] = (members, version, now)
+            self._entries.move_to_end(conversation_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return members
+
+    def member(self, user, conversation_id):
+        """
+        ``(profile_id, display name)`` if ``user`` belongs to the
+        conversation, else None.
+        """
+        return self.members(conversation_id).get(user.pk)
+
+    def invalidate(self, conversation_id):
+        try:
+            cache.incr(_version_key(conversation_id))
+        except ValueError:
+            cache.set(_version_key(conversation_id), 1, None)
+        with self._lock:
+            self._entries.pop(conversation_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+membership = MembershipCache()
@@ -1,14 +1,18 @@
 from django.urls import resolve, Resolver404
-from django.utils import timezone
 
-from profiles.models import Profile
+from .presence import presence
+
+# The presence endpoint sets the state explicitly; the typing and draft
+# fallbacks must not load the profile.
+SKIP_URL_NAMES = {"presence", "typing", "draft"}
 
 
 class MessageAvailabilityMiddleware:
     """
     Marks whether a user is currently viewing the messaging area.
-    Sets Profile.message_available True on messaging routes and False elsewhere
-    (logout is also handled via signal).
+    Heartbeats the presence store on messaging routes and releases it elsewhere,
+    which leaves the user online while a presence socket of theirs is open
+    (logout is also handled via signal). Never writes to the Profile table.
     """
 
     def __init__(self, get_response):
@@ -17,21 +21,20 @@ class MessageAvailabilityMiddleware:
     def __call__(self, request):
         response = self.get_response(request)
 
-        user = getattr(request, "user", None)
-        if not user or not user.is_authenticated:
-            return response
-
         try:
             match = resolve(request.path_info)
-            in_messages = match.namespace == "messaging"
         except Resolver404:
-            in_messages = False
-
-        profile, _ = Profile.objects.get_or_create(user=user)
-        desired_state = bool(in_messages)
-        if profile.message_available != desired_state or desired_state:
-            profile.message_available = desired_state
-            profile.message_available_at = timezone.now()
-            profile.save(update_fields=["message_available", "message_available_at"])
+            match = None
+        if match and match.namespace == "messaging" and match.url_name in SKIP_URL_NAMES:
+            return response
+
+        profile = getattr(request, "profile", None)
+        if not profile:
+            return response
+
+        if match and match.namespace == "messaging":
+            presence.heartbeat(profile.pk)
+        else:
+            presence.release(profile.pk)
 
         return response
@@ -0,0 +1,105 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Substr
+
+
+def backfill_summaries(apps, schema_editor):
+    Conversation = apps.get_model("messaging", "Conversation")
+    Message = apps.get_model("messaging", "Message")
+    Participant = apps.get_model("messaging", "Participant")
+    latest = Message.objects.filter(conversation=OuterRef("pk")).order_by("-created", "-pk")
+    counts = (
+        Message.objects.filter(conversation=OuterRef("pk"))
+        .order_by()
+        .values("conversation")
+        .annotate(n=Count("pk"))
+        .values("n")
+    )
+    Conversation.objects.update(
+        last_message_id=Subquery(latest.values("pk")[:1]),
+        last_message_preview=Coalesce(
+            Subquery(latest.annotate(preview=Substr("text", 1, 120)).values("preview")[:1]),
+            models.Value(""),
+        ),
+        last_sender_id=Subquery(latest.values("sender_id")[:1]),
+        last_message_at=Subquery(latest.values("created")[:1]),
+        message_count=Coalesce(Subquery(counts), 0),
+    )
+    conversation = Conversation.objects.filter(pk=OuterRef("conversation_id"))
+    Participant.objects.update(
+        last_activity=Subquery(
+            conversation.annotate(
+                activity=Coalesce("last_message_at", "created")
+            ).values("activity")[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0002_messagedraft'),
+        ('profiles', '0015_connection_canonical_pair'),
+    ]
+
+    operations = [
+        # Adopt the existing auto-created M2M table as an explicit through model
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='Participant',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='messaging.conversation')),
+                        ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='profiles.profile')),
+                    ],
+                    options={
+                        'db_table': 'messaging_conversation_participants',
+                        'unique_together': {('conversation', 'profile')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='conversation',
+                    name='participants',
+                    field=models.ManyToManyField(related_name='conversations', through='messaging.Participant', to='profiles.profile'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='participant',
+            name='last_activity',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='messaging.message'),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_preview',
+            field=models.CharField(blank=True, default='', max_length=120),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_sender',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='profiles.profile'),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='message_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='participant',
+            index=models.Index(fields=['profile', '-last_activity'], name='participant_inbox_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def mark_history_read(apps, schema_editor):
+    # Existing conversations start fully read rather than all-unread
+    Conversation = apps.get_model("messaging", "Conversation")
+    Participant = apps.get_model("messaging", "Participant")
+    Participant.objects.update(
+        last_read_message_id=Subquery(
+            Conversation.objects.filter(pk=OuterRef("conversation_id")).values("last_message_id")[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0004_message_history_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='participant',
+            name='last_read_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='messaging.message'),
+        ),
+        migrations.AddField(
+            model_name='participant',
+            name='unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(mark_history_read, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0005_participant_read_watermark'),
+    ]
+
+    operations = [
+        # The watermark may name a message that is still being written, so it
+        # becomes a plain id; the column keeps its name and data.
+        migrations.AlterField(
+            model_name='participant',
+            name='last_read_message',
+            field=models.BigIntegerField(blank=True, null=True, db_column='last_read_message_id'),
+        ),
+        migrations.RenameField(
+            model_name='participant',
+            old_name='last_read_message',
+            new_name='last_read_message_id',
+        ),
+        migrations.AlterField(
+            model_name='participant',
+            name='last_read_message_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='message',
+            name='created',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
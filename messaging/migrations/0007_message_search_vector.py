@@ -0,0 +1,31 @@
+from django.db import migrations
+
+
+def create_postgres_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        "ALTER TABLE messaging_message ADD COLUMN search_vector tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('simple', text)) STORED"
+    )
+    schema_editor.execute(
+        "CREATE INDEX messaging_message_search_vector_gin "
+        "ON messaging_message USING gin (search_vector)"
+    )
+
+
+def drop_postgres_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("ALTER TABLE messaging_message DROP COLUMN IF EXISTS search_vector")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0006_write_behind_messages'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_postgres_index, drop_postgres_index),
+    ]
@@ -0,0 +1,52 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0007_message_search_vector'),
+    ]
+
+    operations = [
+        # The summary may name a message that has moved to the archive, so it
+        # becomes a plain id; the column keeps its name and data.
+        migrations.AlterField(
+            model_name='conversation',
+            name='last_message',
+            field=models.BigIntegerField(blank=True, null=True, db_column='last_message_id'),
+        ),
+        migrations.RenameField(
+            model_name='conversation',
+            old_name='last_message',
+            new_name='last_message_id',
+        ),
+        migrations.AlterField(
+            model_name='conversation',
+            name='last_message_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='archived_through',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='MessageArchiveBlock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('segment', models.CharField(max_length=100)),
+                ('offset', models.BigIntegerField()),
+                ('length', models.PositiveIntegerField()),
+                ('message_count', models.PositiveIntegerField()),
+                ('first_created', models.DateTimeField()),
+                ('first_id', models.BigIntegerField()),
+                ('last_created', models.DateTimeField()),
+                ('last_id', models.BigIntegerField()),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archive_blocks', to='messaging.conversation')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['conversation', '-first_created', '-first_id'], name='archive_block_seek_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,131 @@
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest, Substr
+
+SUMMARY_FIELDS = ["last_message_id", "last_message_preview", "last_sender_id", "last_message_at"]
+
+
+def merge_duplicate_conversations(apps, schema_editor):
+    """
+    Give every two-person conversation its canonical pair and fold later
+    duplicates of a pair into the oldest: messages, archive blocks and drafts
+    move over, read watermarks and activity keep the furthest of the two, and
+    the merged conversations' summaries and unread counts are recomputed.
+    """
+    Conversation = apps.get_model("messaging", "Conversation")
+    Participant = apps.get_model("messaging", "Participant")
+    Message = apps.get_model("messaging", "Message")
+    MessageDraft = apps.get_model("messaging", "MessageDraft")
+    MessageArchiveBlock = apps.get_model("messaging", "MessageArchiveBlock")
+
+    members = {}
+    for conversation_id, profile_id in Participant.objects.values_list(
+        "conversation_id", "profile_id"
+    ).iterator():
+        members.setdefault(conversation_id, []).append(profile_id)
+
+    keep = {}
+    merged = set()
+    for conv in Conversation.objects.order_by("created", "pk").iterator():
+        profiles = members.get(conv.pk, [])
+        if len(profiles) != 2:
+            continue
+        pair = tuple(sorted(profiles))
+        kept = keep.get(pair)
+        if kept is None:
+            keep[pair] = conv
+            Conversation.objects.filter(pk=conv.pk).update(pair_low_id=pair[0], pair_high_id=pair[1])
+            continue
+
+        Message.objects.filter(conversation_id=conv.pk).update(conversation_id=kept.pk)
+        MessageArchiveBlock.objects.filter(conversation_id=conv.pk).update(conversation_id=kept.pk)
+        for draft in MessageDraft.objects.filter(conversation_id=conv.pk):
+            other = MessageDraft.objects.filter(conversation_id=kept.pk, profile_id=draft.profile_id).first()
+            if other is not None and other.updated >= draft.updated:
+                continue
+            if other is not None:
+                other.delete()
+            MessageDraft.objects.filter(pk=draft.pk).update(conversation_id=kept.pk)
+        for row in Participant.objects.filter(conversation_id=conv.pk):
+            Participant.objects.filter(conversation_id=kept.pk, profile_id=row.profile_id).update(
+                last_activity=Greatest("last_activity", models.Value(row.last_activity)),
+                last_read_message_id=Greatest(
+                    Coalesce("last_read_message_id", 0), row.last_read_message_id or 0
+                ),
+            )
+        changes = {}
+        if conv.last_message_at and (
+            kept.last_message_at is None or conv.last_message_at > kept.last_message_at
+        ):
+            changes.update({field: getattr(conv, field) for field in SUMMARY_FIELDS})
+        if conv.archived_through and (
+            kept.archived_through is None or conv.archived_through > kept.archived_through
+        ):
+            changes["archived_through"] = conv.archived_through
+        if changes:
+            Conversation.objects.filter(pk=kept.pk).update(**changes)
+            for field, value in changes.items():
+                setattr(kept, field, value)
+        Conversation.objects.filter(pk=conv.pk).delete()
+        merged.add(kept.pk)
+
+    if not merged:
+        return
+    latest = Message.objects.filter(conversation=OuterRef("pk")).order_by("-created", "-pk")
+    counts = (
+        Message.objects.filter(conversation=OuterRef("pk"))
+        .order_by()
+        .values("conversation")
+        .annotate(n=Count("pk"))
+        .values("n")
+    )
+    archived = (
+        MessageArchiveBlock.objects.filter(conversation=OuterRef("pk"))
+        .order_by()
+        .values("conversation")
+        .annotate(n=Sum("message_count"))
+        .values("n")
+    )
+    Conversation.objects.filter(pk__in=merged).update(
+        last_message_id=Coalesce(Subquery(latest.values("pk")[:1]), F("last_message_id")),
+        last_message_preview=Coalesce(
+            Subquery(latest.annotate(preview=Substr("text", 1, 120)).values("preview")[:1]),
+            F("last_message_preview"),
+        ),
+        last_sender_id=Coalesce(Subquery(latest.values("sender_id")[:1]), F("last_sender_id")),
+        last_message_at=Coalesce(Subquery(latest.values("created")[:1]), F("last_message_at")),
+        message_count=Coalesce(Subquery(counts), 0)
+        + Coalesce(Subquery(archived), 0, output_field=models.IntegerField()),
+    )
+    unread = (
+        Message.objects.filter(
+            conversation=OuterRef("conversation_id"),
+            pk__gt=Coalesce(OuterRef("last_read_message_id"), 0),
+        )
+        .exclude(sender=OuterRef("profile_id"))
+        .order_by()
+        .values("conversation")
+        .annotate(n=Count("pk"))
+        .values("n")
+    )
+    activity = Conversation.objects.filter(pk=OuterRef("conversation_id")).annotate(
+        activity=Coalesce("last_message_at", "created")
+    )
+    Participant.objects.filter(conversation_id__in=merged).update(
+        last_activity=Subquery(activity.values("activity")[:1]),
+        unread_count=Coalesce(Subquery(unread), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0009_conversation_pair'),
+    ]
+
+    # Data only: on PostgreSQL the rows it touches leave deferred FK triggers
+    # pending, and the table can't be altered in the same transaction, so the
+    # unique pair comes in 0011.
+    operations = [
+        migrations.RunPython(merge_duplicate_conversations, migrations.RunPython.noop),
+    ]
@@ -1,27 +1,106 @@
 from django.db import models
-from profiles.models import Profile
+from django.utils import timezone
+from profiles.models import Profile, ordered_pair
+
+
+PREVIEW_LENGTH = 120
+
+
+class ConversationQuerySet(models.QuerySet):
+    def between(self, a, b):
+        """
+        The one-to-one conversation of two profiles: one probe on the unique
+        (pair_low, pair_high) index.
+        """
+        low, high = ordered_pair(a, b)
+        return self.filter(pair_low_id=low, pair_high_id=high)
 
 
 class Conversation(models.Model):
-    participants = models.ManyToManyField(Profile, related_name="conversations")
+    """
+    One-to-one conversations carry their pair of profiles in id order in
+    ``pair_low``/``pair_high``, unique together, so finding or creating the
+    conversation between two people is one probe on that index.
+    """
+
+    participants = models.ManyToManyField(
+        Profile, related_name="conversations", through="Participant"
+    )
+    pair_low = models.ForeignKey(
+        Profile, null=True, blank=True, related_name="+", on_delete=models.SET_NULL
+    )
+    pair_high = models.ForeignKey(
+        Profile, null=True, blank=True, related_name="+", on_delete=models.SET_NULL
+    )
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
+    # Summary of the latest message, kept in step by messaging.inbox.post_message.
+    # A plain id: the message may since have moved to the archive.
+    last_message_id = models.BigIntegerField(null=True, blank=True)
+    last_message_preview = models.CharField(max_length=PREVIEW_LENGTH, blank=True, default="")
+    last_sender = models.ForeignKey(
+        Profile, null=True, blank=True, on_delete=models.SET_NULL, related_name="+"
+    )
+    last_message_at = models.DateTimeField(blank=True, null=True)
+    message_count = models.PositiveIntegerField(default=0)
+    # Newest message moved to the archive; older history is read from there
+    archived_through = models.DateTimeField(blank=True, null=True)
+
+    objects = ConversationQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["pair_low", "pair_high"], name="conversation_unique_pair"
+            ),
+        ]
 
     def __str__(self):
         names = ", ".join(self.participants.values_list("user__username", flat=True))
         return f"Conversation({names})"
 
 
+class Participant(models.Model):
+    """
+    Membership row behind ``Conversation.participants``. ``last_activity``
+    mirrors the conversation's latest message time so a profile's inbox is a
+    range scan on ``participant_inbox_idx``; ``unread_count`` is maintained
+    alongside so the same read yields unread badges.
+    """
+
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE)
+    profile = models.ForeignKey(Profile, on_delete=models.CASCADE)
+    last_activity = models.DateTimeField(default=timezone.now)
+    # Read watermark (a message id, possibly not yet written) and the count of
+    # others' messages past it
+    last_read_message_id = models.BigIntegerField(null=True, blank=True)
+    unread_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = "messaging_conversation_participants"
+        unique_together = ("conversation", "profile")
+        indexes = [
+            models.Index(fields=["profile", "-last_activity"], name="participant_inbox_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.profile} in {self.conversation_id}"
+
+
 class Message(models.Model):
     conversation = models.ForeignKey(
         Conversation, related_name="messages", on_delete=models.CASCADE
     )
     sender = models.ForeignKey(Profile, related_name="sent_messages", on_delete=models.CASCADE)
     text = models.TextField()
-    created = models.DateTimeField(auto_now_add=True)
+    # set when the server accepts the message, which may precede the INSERT
+    created = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         ordering = ["created"]
+        indexes = [
+            models.Index(fields=["conversation", "created", "id"], name="message_history_idx"),
+        ]
 
     def __str__(self):
         return f"{self.sender} @ {self.created:%Y-%m-%d %H:%M}"
@@ -40,3 +119,35 @@ class MessageDraft(models.Model):
 
     def __str__(self):
         return f"Draft({self.profile} -> {self.conversation_id})"
+
+
+class MessageArchiveBlock(models.Model):
+    """
+    Offset index into the cold archive: one gzip member of a segment file
+    under ``MESSAGE_ARCHIVE_DIR`` holding up to a block's worth of one
+    conversation's messages as JSON lines, oldest first. Paging seeks on
+    ``archive_block_seek_idx`` and reads only the blocks it needs.
+    """
+
+    conversation = models.ForeignKey(
+        Conversation, related_name="archive_blocks", on_delete=models.CASCADE
+    )
+    segment = models.CharField(max_length=100)
+    offset = models.BigIntegerField()
+    length = models.PositiveIntegerField()
+    message_count = models.PositiveIntegerField()
+    first_created = models.DateTimeField()
+    first_id = models.BigIntegerField()
+    last_created = models.DateTimeField()
+    last_id = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["conversation", "-first_created", "-first_id"],
+                name="archive_block_seek_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.segment}@{self.offset} ({self.conversation_id})"
@@ -0,0 +1,246 @@
+import asyncio
+import logging
+import threading
+import time
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 10
+# Socket counts outlive the heartbeats that refresh them by this factor; a
+# dead worker's sockets never detach, so its counts lapse after that long
+SOCKET_COUNT_TTL_FACTOR = 4
+
+
+class InMemoryPresenceBackend:
+    """
+    Heartbeat expiry times in a dict; only correct for a single process.
+    ``heartbeat`` and ``clear`` return True when the profile's state flipped;
+    ``attach`` and ``detach`` count the profile's open sockets and return the
+    new count, ``sockets`` reads it.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._expires = {}
+        self._sockets = {}
+
+    def attach(self, profile_id):
+        with self._lock:
+            count = self._sockets[profile_id] = self._sockets.get(profile_id, 0) + 1
+        return count
+
+    def detach(self, profile_id):
+        with self._lock:
+            count = self._sockets.get(profile_id, 0) - 1
+            if count > 0:
+                self._sockets[profile_id] = count
+            else:
+                self._sockets.pop(profile_id, None)
+        return max(count, 0)
+
+    def sockets(self, profile_id):
+        with self._lock:
+            return self._sockets.get(profile_id, 0)
+
+    def heartbeat(self, profile_id):
+        now = time.monotonic()
+        with self._lock:
+            came_online = self._expires.get(profile_id, 0) <= now
+            self._expires[profile_id] = now + self.ttl
+        return came_online
+
+    def clear(self, profile_id):
+        with self._lock:
+            return self._expires.pop(profile_id, 0) > time.monotonic()
+
+    def online(self, profile_ids):
+        now = time.monotonic()
+        with self._lock:
+            return {pid: self._expires.get(pid, 0) > now for pid in profile_ids}
+
+
+class CachePresenceBackend:
+    """
+    One expiring cache key per online profile, for multi-worker deployments
+    with a shared cache (Redis, memcached). Batched reads are a single
+    get_many. Socket counts are cache counters too; where ``incr`` isn't
+    atomic (the database cache) a racing pair can undercount, which at worst
+    clears presence early until the next heartbeat. Heartbeats keep a count
+    alive; one they stop refreshing expires a few TTLs later.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, alias="default", prefix="presence"):
+        self.ttl = ttl
+        self.count_ttl = ttl * SOCKET_COUNT_TTL_FACTOR
+        self.cache = caches[alias]
+        self.prefix = prefix
+
+    def _key(self, profile_id):
+        return f"{self.prefix}:{profile_id}"
+
+    def _sockets_key(self, profile_id):
+        return f"{self.prefix}:sockets:{profile_id}"
+
+    def attach(self, profile_id):
+        key = self._sockets_key(profile_id)
+        self.cache.add(key, 0, self.count_ttl)
+        try:
+            count = self.cache.incr(key)
+        except ValueError:
+            # expired between the add and the incr
+            self.cache.set(key, 1, self.count_ttl)
+            return 1
+        self.cache.touch(key, self.count_ttl)
+        return count
+
+    def detach(self, profile_id):
+        key = self._sockets_key(profile_id)
+        try:
+            count = self.cache.decr(key)
+        except ValueError:
+            return 0
+        if count <= 0:
+            self.cache.delete(key)
+        return max(count, 0)
+
+    def sockets(self, profile_id):
+        return max(self.cache.get(self._sockets_key(profile_id), 0), 0)
+
+    def heartbeat(self, profile_id):
+        self.cache.touch(self._sockets_key(profile_id), self.count_ttl)
+        key = self._key(profile_id)
+        if self.cache.add(key, 1, self.ttl):
+            return True
+        self.cache.touch(key, self.ttl)
+        return False
+
+    def clear(self, profile_id):
+        return self.cache.delete(self._key(profile_id))
+
+    def online(self, profile_ids):
+        keys = {self._key(pid): pid for pid in profile_ids}
+        found = self.cache.get_many(list(keys))
+        return {pid: key in found for key, pid in keys.items()}
+
+
+def presence_group(profile_id):
+    return f"presence_{profile_id}"
+
+
+class Presence:
+    """
+    Facade over the configured backend (``settings.PRESENCE_BACKEND``),
+    resolved on first use. Online/offline transitions are pushed to the
+    profile's presence group so subscribed sockets never have to poll.
+    """
+
+    def __init__(self):
+        self._backend = None
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            path = getattr(
+                settings, "PRESENCE_BACKEND", "messaging.presence.InMemoryPresenceBackend"
+            )
+            ttl = getattr(settings, "PRESENCE_TTL", DEFAULT_TTL)
+            self._backend = import_string(path)(ttl=ttl)
+        return self._backend
+
+    def heartbeat(self, profile_id):
+        if self.backend.heartbeat(profile_id):
+            self.publish(profile_id, True)
+
+    def clear(self, profile_id):
+        if self.backend.clear(profile_id):
+            self.publish(profile_id, False)
+
+    def connect(self, profile_id):
+        """
+        A presence socket opened (or its tab became visible again).
+        """
+        self.backend.attach(profile_id)
+        self.heartbeat(profile_id)
+
+    def disconnect(self, profile_id):
+        """
+        A presence socket closed (or its tab was hidden); the profile goes
+        offline only when that was its last one.
+        """
+        if self.backend.detach(profile_id) == 0:
+            self.clear(profile_id)
+
+    def release(self, profile_id):
+        """
+        The user left messaging outside a socket (another page, an explicit
+        "unavailable"): offline, unless a presence socket of theirs is open.
+        """
+        if self.backend.sockets(profile_id) == 0:
+            self.clear(profile_id)
+
+    def publish(self, profile_id, online):
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        async_to_sync(channel_layer.group_send)(
+            presence_group(profile_id),
+            {"type": "presence.update", "profile_id": profile_id, "online": online},
+        )
+
+    def online(self, profile_ids):
+        return self.backend.online(list(profile_ids))
+
+    def is_online(self, profile_id):
+        return self.online([profile_id])[profile_id]
+
+
+presence = Presence()
+
+
+class PresenceSweep:
+    """
+    Heartbeat keys expire without anyone publishing it (a killed tab, a dead
+    worker). Every ``interval`` seconds each process reads the states its
+    presence sockets watch, in one batched read, and hands every socket the
+    current states so it can push the ones that changed.
+    """
+
+    def __init__(self, interval=None):
+        self.interval = interval
+        self._sockets = set()
+        self._task = None
+
+    def add(self, socket):
+        self._sockets.add(socket)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def discard(self, socket):
+        self._sockets.discard(socket)
+
+    async def _run(self):
+        interval = self.interval or getattr(settings, "PRESENCE_TTL", DEFAULT_TTL) / 2
+        while self._sockets:
+            await asyncio.sleep(interval)
+            sockets = list(self._sockets)
+            watched = set().union(*(socket.watching for socket in sockets))
+            if not watched:
+                continue
+            try:
+                states = await database_sync_to_async(presence.online)(watched)
+            except Exception:
+                logger.exception("presence sweep failed")
+                continue
+            for socket in sockets:
+                await socket.apply_states(states)
+
+
+presence_sweep = PresenceSweep()
@@ -1,7 +1,8 @@
 from django.urls import path
 
-from .consumers import ChatConsumer
+from .consumers import ChatConsumer, PresenceConsumer
 
 websocket_urlpatterns = [
     path("ws/chat/<int:conversation_id>/", ChatConsumer.as_asgi()),
+    path("ws/presence/", PresenceConsumer.as_asgi()),
 ]
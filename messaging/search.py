@@ -0,0 +1,164 @@
+"""
+Message search backend.
+
+On PostgreSQL the 0007 migration adds a generated ``search_vector`` tsvector
+column on ``messaging_message`` with a GIN index, so new messages are indexed
+by the same INSERT that writes them. Other databases (SQLite test runs) use an
+in-process inverted index fed by ``persist_messages``. Either way results are
+scoped to the searcher's conversations by joining through the participant
+table's (conversation, profile) unique index. Only the hot table is searched:
+messages moved to archive segments by ``archive_messages`` are not.
+"""
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+
+from profiles.search import TOKEN_RE, tokenize
+from .models import Message, Participant
+
+SEARCH_PAGE_SIZE = 20
+MAX_FALLBACK_MATCHES = 5000
+SNIPPET_BEFORE = 6  # words of context before the first hit
+SNIPPET_AFTER = 14
+
+
+class MessageSearchIndex:
+    """
+    Pure-Python stand-in for the Postgres index: token postings with prefix
+    lookup over a sorted vocabulary, plus each message's conversation so
+    matches can be scoped before they are ranked. Loaded lazily from
+    ``Message`` and kept current by ``persist_messages`` in this process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._postings = defaultdict(set)
+        self._conversation_of = {}
+        self._vocab = None
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        rows = Message.objects.values_list("pk", "conversation_id", "text")
+        for pk, conversation_id, text in rows.iterator():
+            self._add(pk, conversation_id, text)
+        self._loaded = True
+
+    def _add(self, pk, conversation_id, text):
+        self._conversation_of[pk] = conversation_id
+        for token in set(tokenize(text)):
+            if token not in self._postings:
+                self._vocab = None
+            self._postings[token].add(pk)
+
+    def add(self, messages):
+        with self._lock:
+            if not self._loaded:
+                return
+            for msg in messages:
+                self._add(msg.pk, msg.conversation_id, msg.text)
+
+    def search(self, query, conversation_ids=None):
+        """
+        Ids of messages containing every query term (as a word prefix),
+        only those in ``conversation_ids`` when given.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return set()
+        with self._lock:
+            self._ensure_loaded()
+            if self._vocab is None:
+                self._vocab = sorted(self._postings)
+            matches = None
+            for term in terms:
+                term_matches = set()
+                i = bisect_left(self._vocab, term)
+                while i < len(self._vocab) and self._vocab[i].startswith(term):
+                    term_matches |= self._postings[self._vocab[i]]
+                    i += 1
+                matches = term_matches if matches is None else matches & term_matches
+                if not matches:
+                    return set()
+            if conversation_ids is not None:
+                conversation_of = self._conversation_of
+                matches = {pk for pk in matches if conversation_of.get(pk) in conversation_ids}
+        return matches
+
+
+search_index = MessageSearchIndex()
+
+
+def _postgres_search(queryset, terms):
+    table = Message._meta.db_table
+    prefix_query = " & ".join(f"{t}:*" for t in terms)
+    return queryset.filter(
+        RawSQL(
+            f'"{table}"."search_vector" @@ to_tsquery(\'simple\', %s)',
+            (prefix_query,),
+            output_field=BooleanField(),
+        )
+    )
+
+
+def _fallback_search(queryset, profile, query):
+    # scope before keeping the newest matches, or other users' newer ones
+    # would crowd this profile's out of the cap
+    conversation_ids = set(
+        Participant.objects.filter(profile=profile).values_list("conversation_id", flat=True)
+    )
+    matches = search_index.search(query, conversation_ids)
+    ids = sorted(matches, reverse=True)[:MAX_FALLBACK_MATCHES]
+    return queryset.filter(pk__in=ids)
+
+
+def search_messages(profile, query):
+    """
+    Messages in ``profile``'s conversations matching ``query``; every term
+    must match the start of a word. Archived messages are not included.
+    """
+    queryset = Message.objects.filter(conversation__participant__profile=profile)
+    terms = tokenize(query)
+    if not terms:
+        return queryset.none()
+    if connection.vendor == "postgresql":
+        return _postgres_search(queryset, terms)
+    return _fallback_search(queryset, profile, query)
+
+
+def highlight(text, query):
+    """
+    An HTML snippet of ``text`` around the first hit, with every hit wrapped
+    in ``<mark>``; everything else is escaped.
+    """
+    terms = tokenize(query)
+    words = list(TOKEN_RE.finditer(text))
+    hits = [i for i, word in enumerate(words) if word.group().lower().startswith(tuple(terms))]
+    if not words:
+        return escape(text)
+    first = hits[0] if hits else 0
+    start = words[max(first - SNIPPET_BEFORE, 0)].start()
+    end = words[min(first + SNIPPET_AFTER, len(words) - 1)].end()
+    if start <= words[0].start():
+        start = 0
+    if end >= words[-1].end():
+        end = len(text)
+    parts = ["…" if start else ""]
+    position = start
+    for i in hits:
+        word = words[i]
+        if word.start() < start or word.end() > end:
+            continue
+        parts.append(escape(text[position : word.start()]))
+        parts.append(f"<mark>{escape(word.group())}</mark>")
+        position = word.end()
+    parts.append(escape(text[position:end]))
+    parts.append("…" if end < len(text) else "")
+    return re.sub(r"\s+", " ", "".join(parts)).strip()
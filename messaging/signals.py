@@ -1,8 +1,12 @@
 from django.contrib.auth.signals import user_logged_out
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
-from django.utils import timezone
 
 from profiles.models import Profile
+from .membership import membership
+from .models import Conversation, Participant
+from .presence import presence
 
 
 @receiver(user_logged_out)
@@ -12,11 +16,37 @@ def clear_message_available(sender, request, user, **kwargs):
     """
     if not user:
         return
-    try:
-        profile = Profile.objects.get(user=user)
-    except Profile.DoesNotExist:
-        return
-    if profile.message_available:
-        profile.message_available = False
-        profile.message_available_at = timezone.now()
-        profile.save(update_fields=["message_available", "message_available_at"])
+    profile_id = Profile.objects.filter(user=user).values_list("pk", flat=True).first()
+    if profile_id is not None:
+        presence.clear(profile_id)
+
+
+def _membership_changed(conversation_id):
+    # after commit, so no worker reloads the old member set under the new version
+    transaction.on_commit(lambda: membership.invalidate(conversation_id))
+
+
+@receiver(post_save, sender=Participant)
+@receiver(post_delete, sender=Participant)
+def participant_changed(sender, instance, **kwargs):
+    _membership_changed(instance.conversation_id)
+
+
+@receiver(m2m_changed, sender=Conversation.participants.through)
+def participants_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    ``participants.add()`` and friends write Participant rows in bulk, without
+    per-row signals.
+    """
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            _membership_changed(instance.pk)
+    elif action == "pre_clear":
+        # cleared from the profile's side: find its conversations while it has them
+        for conversation_id in Participant.objects.filter(profile=instance).values_list(
+            "conversation_id", flat=True
+        ):
+            _membership_changed(conversation_id)
+    elif action in ("post_add", "post_remove"):
+        for conversation_id in pk_set:
+            _membership_changed(conversation_id)
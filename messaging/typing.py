@@ -0,0 +1,62 @@
+import threading
+import time
+
+from .frames import chat_broadcaster, chat_group
+
+TYPING_TTL = 6.0
+
+
+def typing_payload(name, typing):
+    return {"kind": "typing", "sender": name, "typing": typing}
+
+
+class TypingTracker:
+    """
+    Who is typing where, per (conversation, profile), in process memory.
+    ``update`` returns True only when the state flips, so callers broadcast
+    transitions instead of every keystroke. A true that isn't refreshed within
+    ``ttl`` seconds expires and is broadcast as false by a sweeper thread.
+    """
+
+    def __init__(self, ttl=TYPING_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._typing = {}
+        self._timer = None
+
+    def update(self, conversation_id, profile_id, name, typing):
+        key = (conversation_id, profile_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._typing.get(key)
+            was_typing = entry is not None and entry[0] > now
+            if typing:
+                self._typing[key] = (now + self.ttl, name)
+                if self._timer is None:
+                    self._start_timer()
+            else:
+                self._typing.pop(key, None)
+        return typing != was_typing
+
+    def _start_timer(self):
+        self._timer = threading.Timer(self.ttl / 2, self._sweep)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _sweep(self):
+        now = time.monotonic()
+        with self._lock:
+            expired = [(key, name) for key, (until, name) in self._typing.items() if until <= now]
+            for key, _ in expired:
+                del self._typing[key]
+            self._timer = None
+            if self._typing:
+                self._start_timer()
+        for (conversation_id, profile_id), name in expired:
+            chat_broadcaster.publish(
+                chat_group(conversation_id), typing_payload(name, False), sender_id=profile_id
+            )
+
+
+typing_tracker = TypingTracker()
+
@@ -1,11 +1,20 @@
 from django.urls import path
 
-from .views import MessagesView, MessageAvailabilityView, TypingStatusView, MessageDraftView
+from .views import (
+    MessagesView,
+    MessageHistoryView,
+    MessageSearchView,
+    MessageAvailabilityView,
+    TypingStatusView,
+    MessageDraftView,
+)
 
 app_name = "messaging"
 
 urlpatterns = [
     path("", MessagesView.as_view(), name="inbox"),
+    path("history/", MessageHistoryView.as_view(), name="history"),
+    path("search/", MessageSearchView.as_view(), name="search"),
     path("presence/", MessageAvailabilityView.as_view(), name="presence"),
     path("typing/", TypingStatusView.as_view(), name="typing"),
     path("draft/", MessageDraftView.as_view(), name="draft"),
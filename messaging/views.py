@@ -1,112 +1,209 @@
-from django.contrib.auth.mixins import LoginRequiredMixin
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.contrib.auth.mixins import AccessMixin, LoginRequiredMixin
+from django.core.handlers.asgi import ASGIRequest
 from django.http import JsonResponse, HttpResponseBadRequest
 from django.shortcuts import redirect, render
+from django.urls import reverse
+from django.template.loader import render_to_string
 from django.views import View
-from django.db.models import Q, Prefetch
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
 from django.utils import timezone
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
-from datetime import timedelta
 
-from profiles.models import Profile, Connection
-from .models import Conversation, Message, MessageDraft
+from profiles.graph import connection_graph
+from profiles.middleware import get_request_profile
+from profiles.models import Connection, Profile
+from profiles.pagination import keyset_page, parse_cursor
+from .drafts import draft_buffer
+from .frames import chat_broadcaster, chat_group
+from .inbox import history_page, inbox_threads, mark_read, open_conversation, post_message
+from .membership import membership
+from .models import Conversation
+from .presence import presence
+from .search import SEARCH_PAGE_SIZE, highlight, search_messages
+from .typing import typing_payload, typing_tracker
 
 
-class MessagesView(LoginRequiredMixin, View):
+class AsyncLoginRequiredMixin(AccessMixin):
+    """
+    ``LoginRequiredMixin`` for async views, reading the user without blocking
+    the event loop.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return await sync_to_async(self.handle_no_permission)()
+        return await super().dispatch(request, *args, **kwargs)
+
+
+async def broadcast(request, group, payload, sender_id=None):
+    """
+    Schedule ``payload`` for ``group`` without waiting on the channel layer.
+    Only an ASGI server's loop outlives the request; under WSGI the view runs
+    on a loop that closes when it returns, so the send is awaited there.
+    """
+    if isinstance(request, ASGIRequest):
+        chat_broadcaster.publish(group, payload, sender_id=sender_id)
+    else:
+        await chat_broadcaster.send(group, payload, sender_id=sender_id)
+
+
+class MessagesView(AsyncLoginRequiredMixin, View):
+    """
+    The inbox page, and the send path for clients without a socket. Async so
+    a send can hand its broadcast to the event loop and respond; the page
+    itself is sync code and renders in a worker thread.
+    """
+
     template_name = "messaging/inbox.html"
 
-    def get(self, request):
-        me, _ = Profile.objects.get_or_create(user=request.user)
-        connected_profiles = []
-        for c in Connection.objects.filter(
-            Q(requester=me, status="accepted") | Q(receiver=me, status="accepted")
-        ):
-            other = c.receiver if c.requester == me else c.requester
-            connected_profiles.append(other)
-
-        threads = []
-        now = timezone.now()
-        presence_ttl = timedelta(seconds=2)
-        for other in connected_profiles:
-            conv = (
-                Conversation.objects.filter(participants=me)
-                .filter(participants=other)
-                .first()
-            )
-            if not conv:
-                conv = Conversation.objects.create()
-                conv.participants.add(me, other)
-            last_msg = conv.messages.last()
-            is_online = bool(
-                other.message_available
-                and other.message_available_at
-                and other.message_available_at >= now - presence_ttl
-            )
-            threads.append(
-                {
-                    "conv": conv,
-                    "other": other,
-                    "last_msg": last_msg,
-                    "is_online": is_online,
-                }
-            )
+    async def get(self, request):
+        return await sync_to_async(self._inbox)(request)
 
-        threads = sorted(
-            threads,
-            key=lambda x: x["last_msg"].created if x["last_msg"] else x["conv"].updated,
-            reverse=True,
-        )
+    def _inbox(self, request):
+        me = request.profile
+        if request.GET.get("with"):
+            return self._open_thread(request, me, request.GET["with"])
+
+        threads = inbox_threads(me)
+        online = presence.online(t["other"].pk for t in threads)
+        for t in threads:
+            t["is_online"] = online.get(t["other"].pk, False)
         conversation_id = request.GET.get("conversation")
-        active = None
+        started = [t for t in threads if t["conv"]]
+        active_thread = None
         if conversation_id:
-            for t in threads:
+            for t in started:
                 if str(t["conv"].id) == str(conversation_id):
-                    active = t["conv"]
+                    active_thread = t
                     break
-        if active is None and threads:
-            active = threads[0]["conv"]
-        messages = active.messages.all() if active else []
-        active_other = active.participants.exclude(pk=me.pk).first() if active else None
-        draft_text = ""
-        if active:
-            draft = MessageDraft.objects.filter(profile=me, conversation=active).first()
-            draft_text = draft.text if draft else ""
+        if active_thread is None and started:
+            active_thread = started[0]
+        active = active_thread["conv"] if active_thread else None
+        if active and active.unread_count:
+            mark_read(me.pk, active)
+            active.unread_count = 0
+        messages, older_cursor = history_page(active) if active else ([], None)
+        active_other = active_thread["other"] if active_thread else None
+        draft_text = draft_buffer.load(me.pk, active.pk) if active else ""
         context = {
             "profile": me,
             "threads": threads,
             "active": active,
             "messages": messages,
+            "older_cursor": older_cursor,
             "active_other": active_other,
             "draft_text": draft_text,
+            "presence_ttl": settings.PRESENCE_TTL,
         }
         return render(request, self.template_name, context)
 
-    def post(self, request):
-        me, _ = Profile.objects.get_or_create(user=request.user)
+    def _open_thread(self, request, me, other_id):
+        """
+        Open (creating on first use) the conversation with a connection.
+        """
+        if not str(other_id).isdigit():
+            return redirect(request.path)
+        other_id = int(other_id)
+        if connection_graph.status(me.pk, other_id) != Connection.STATUS_ACCEPTED:
+            return redirect(request.path)
+        other = Profile.objects.filter(pk=other_id).first()
+        if other is None:
+            return redirect(request.path)
+        conv = open_conversation(me, other)
+        return redirect(f"{request.path}?conversation={conv.id}")
+
+    async def post(self, request):
+        """
+        Send without a socket. The message is stored before responding; its
+        broadcast is only scheduled, so the channel layer never adds to the
+        request's latency. Clients asking for JSON get the message back,
+        server id included, to reconcile their copy; forms get a redirect.
+        """
         conversation_id = request.POST.get("conversation_id")
         text = request.POST.get("text", "").strip()
+        wants_json = request.get_preferred_type(["text/html", "application/json"]) == "application/json"
         if not text:
+            if wants_json:
+                return HttpResponseBadRequest("text required")
             return redirect(request.path)
-        try:
-            conv = Conversation.objects.get(pk=conversation_id, participants=me)
-        except Conversation.DoesNotExist:
+        user = await request.auser()
+        conversation_id = int(conversation_id) if str(conversation_id).isdigit() else None
+        if (
+            conversation_id is None
+            or await database_sync_to_async(membership.member)(user, conversation_id) is None
+        ):
+            if wants_json:
+                return HttpResponseBadRequest("invalid conversation")
             return redirect(request.path)
-        Message.objects.create(conversation=conv, sender=me, text=text)
-        conv.updated = timezone.now()
-        conv.save(update_fields=["updated"])
-        channel_layer = get_channel_layer()
+        me = await database_sync_to_async(get_request_profile)(request)
+        msg = await database_sync_to_async(post_message)(conversation_id, me, text)
         payload = {
             "kind": "message",
+            "id": msg.pk,
             "sender": me.user.get_full_name() or me.user.username,
             "text": text,
             "timestamp": timezone.now().strftime("%-I:%M %p"),
         }
-        async_to_sync(channel_layer.group_send)(
-            f"chat_{conv.id}", {"type": "chat.message", "payload": payload}
+        await broadcast(request, chat_group(conversation_id), payload)
+        if wants_json:
+            return JsonResponse(payload)
+        return redirect(f"{request.path}?conversation={conversation_id}")
+
+
+class MessageHistoryView(LoginRequiredMixin, View):
+    """
+    JSON "load older" endpoint: the page of messages before ``before``.
+    """
+
+    def get(self, request):
+        me = request.profile
+        conversation_id = request.GET.get("conversation")
+        if not conversation_id:
+            return HttpResponseBadRequest("conversation required")
+        try:
+            conv = Conversation.objects.get(pk=conversation_id, participants=me)
+        except (Conversation.DoesNotExist, ValueError):
+            return HttpResponseBadRequest("invalid conversation")
+        messages, older_cursor = history_page(conv, before=request.GET.get("before"))
+        html = "".join(
+            render_to_string(
+                "messaging/partials/message_bubble.html", {"msg": msg, "profile": me}, request=request
+            )
+            for msg in messages
         )
-        return redirect(f"{request.path}?conversation={conv.id}")
+        return JsonResponse({"html": html, "next_cursor": older_cursor})
+
+
+class MessageSearchView(LoginRequiredMixin, View):
+    """
+    JSON search across the user's conversations, newest matches first, with
+    highlighted snippets and a cursor for the next page.
+    """
+
+    def get(self, request):
+        query = request.GET.get("q", "").strip()
+        messages, next_cursor = keyset_page(
+            search_messages(request.profile, query).select_related("sender__user"),
+            parse_cursor(request.GET.get("cursor")),
+            page_size=SEARCH_PAGE_SIZE,
+        )
+        inbox_url = reverse("messaging:inbox")
+        results = [
+            {
+                "id": msg.pk,
+                "conversation_id": msg.conversation_id,
+                "sender": msg.sender.user.get_full_name() or msg.sender.user.username,
+                "snippet": highlight(msg.text, query),
+                "timestamp": timezone.localtime(msg.created).strftime("%b %-d, %-I:%M %p"),
+                "url": f"{inbox_url}?conversation={msg.conversation_id}",
+            }
+            for msg in messages
+        ]
+        return JsonResponse({"results": results, "next_cursor": next_cursor})
 
 
 @method_decorator(csrf_exempt, name="dispatch")
@@ -117,7 +214,7 @@ class MessageAvailabilityView(LoginRequiredMixin, View):
     """
 
     def post(self, request):
-        me, _ = Profile.objects.get_or_create(user=request.user)
+        me = request.profile
         available_raw = request.POST.get("available") or request.GET.get("available")
         val = str(available_raw).lower() if available_raw is not None else ""
         true_vals = ["1", "true", "yes", "on"]
@@ -127,12 +224,13 @@ class MessageAvailabilityView(LoginRequiredMixin, View):
         elif val in false_vals:
             desired_state = False
         else:
-            return JsonResponse({"status": "ignored", "available": me.message_available})
+            return JsonResponse({"status": "ignored", "available": presence.is_online(me.pk)})
 
-        me.message_available = desired_state
-        me.message_available_at = timezone.now()
-        me.save(update_fields=["message_available", "message_available_at"])
-        return JsonResponse({"status": "ok", "available": me.message_available})
+        if desired_state:
+            presence.heartbeat(me.pk)
+        else:
+            presence.release(me.pk)
+        return JsonResponse({"status": "ok", "available": desired_state})
 
     def get(self, request):
         ids_param = request.GET.get("ids", "")
@@ -140,73 +238,47 @@ class MessageAvailabilityView(LoginRequiredMixin, View):
             ids = [int(i) for i in ids_param.split(",") if i.strip().isdigit()]
         except ValueError:
             ids = []
-        now = timezone.now()
-        presence_ttl = timedelta(seconds=2)
-        states = {}
-        for p in Profile.objects.filter(id__in=ids).values(
-            "id", "message_available", "message_available_at"
-        ):
-            active = bool(
-                p["message_available"]
-                and p["message_available_at"]
-                and p["message_available_at"] >= now - presence_ttl
-            )
-            states[p["id"]] = active
-        return JsonResponse({"states": states})
+        return JsonResponse({"states": presence.online(ids)})
 
 
-class TypingStatusView(LoginRequiredMixin, View):
+class TypingStatusView(AsyncLoginRequiredMixin, View):
     """
     Fallback endpoint to broadcast typing indicators when WebSocket isn't available.
+    Only state changes are broadcast; membership comes from ``membership``.
     """
 
-    def post(self, request):
-        me, _ = Profile.objects.get_or_create(user=request.user)
+    async def post(self, request):
         conversation_id = request.POST.get("conversation_id")
-        if not conversation_id:
+        if not conversation_id or not str(conversation_id).isdigit():
             return HttpResponseBadRequest("conversation_id required")
-        try:
-            conv = Conversation.objects.get(pk=conversation_id, participants=me)
-        except Conversation.DoesNotExist:
+        user = await request.auser()
+        member = await database_sync_to_async(membership.member)(user, int(conversation_id))
+        if member is None:
             return HttpResponseBadRequest("invalid conversation")
 
+        profile_id, name = member
         typing_flag = str(request.POST.get("typing", "")).lower() in ["1", "true", "yes", "on"]
-        channel_layer = get_channel_layer()
-        payload = {
-            "kind": "typing",
-            "sender": me.user.get_full_name() or me.user.username,
-            "typing": typing_flag,
-        }
-        async_to_sync(channel_layer.group_send)(
-            f"chat_{conv.id}", {"type": "chat.message", "payload": payload}
-        )
+        if typing_tracker.update(int(conversation_id), profile_id, name, typing_flag):
+            await broadcast(
+                request, chat_group(conversation_id), typing_payload(name, typing_flag), sender_id=profile_id
+            )
         return JsonResponse({"status": "ok"})
 
 
 class MessageDraftView(LoginRequiredMixin, View):
     """
-    Save or clear a user's draft for a conversation.
+    Save or clear a user's draft for a conversation (HTTP fallback for the
+    socket's draft frames). Drafts go to the write-behind buffer.
     """
 
     def post(self, request):
-        me, _ = Profile.objects.get_or_create(user=request.user)
         conversation_id = request.POST.get("conversation_id")
-        if not conversation_id:
+        if not conversation_id or not str(conversation_id).isdigit():
             return HttpResponseBadRequest("conversation_id required")
-        try:
-            conv = Conversation.objects.get(pk=conversation_id, participants=me)
-        except Conversation.DoesNotExist:
+        member = membership.member(request.user, int(conversation_id))
+        if member is None:
             return HttpResponseBadRequest("invalid conversation")
 
-        text = request.POST.get("text", "")
-        text = text if text is not None else ""
-        text = text.strip()
-        draft, _ = MessageDraft.objects.get_or_create(profile=me, conversation=conv)
-        if text:
-            if draft.text != text:
-                draft.text = text
-                draft.save(update_fields=["text", "updated"])
-        else:
-            if draft.pk:
-                draft.delete()
+        profile_id, _ = member
+        draft_buffer.save(profile_id, int(conversation_id), request.POST.get("text", ""))
         return JsonResponse({"status": "ok"})
@@ -0,0 +1,75 @@
+import asyncio
+import atexit
+
+from channels.db import database_sync_to_async
+
+from .inbox import persist_messages
+
+
+class MessageWriter:
+    """
+    Write-behind buffer for chat messages received over WebSockets. Messages
+    arrive with their ids already assigned and have been broadcast; they are
+    written in arrival order by ``persist_messages`` in micro-batches, flushed
+    once ``max_batch`` are waiting or ``flush_interval`` seconds after the
+    first one. ``submit`` returns a future resolved when the message's batch
+    has committed (or failed), which the consumer turns into an ack. Sockets
+    flush on disconnect, and whatever is left is written at interpreter exit.
+    """
+
+    def __init__(self, max_batch=200, flush_interval=0.05):
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._timer = None
+        self._lock = None
+
+    def submit(self, message):
+        loop = asyncio.get_running_loop()
+        saved = loop.create_future()
+        self._pending.append((message, saved))
+        if len(self._pending) >= self.max_batch:
+            self._cancel_timer()
+            loop.create_task(self.flush())
+        elif self._timer is None:
+            self._timer = loop.call_later(
+                self.flush_interval, lambda: loop.create_task(self.flush())
+            )
+        return saved
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    async def flush(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # batches are taken and written under the lock so they commit in order
+        async with self._lock:
+            self._cancel_timer()
+            batch, self._pending = self._pending, []
+            if not batch:
+                return
+            try:
+                await database_sync_to_async(persist_messages)([msg for msg, _ in batch])
+            except Exception as exc:
+                for _, saved in batch:
+                    saved.set_exception(exc)
+                return
+            for msg, saved in batch:
+                saved.set_result(msg.pk)
+
+    def flush_pending(self):
+        """
+        Write what is still waiting from synchronous code, once the event
+        loop has stopped; nobody is left to ack it.
+        """
+        batch, self._pending = self._pending, []
+        self._timer = None
+        if batch:
+            persist_messages([msg for msg, _ in batch])
+
+
+message_writer = MessageWriter()
+atexit.register(message_writer.flush_pending)
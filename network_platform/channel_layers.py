@@ -0,0 +1,321 @@
+import asyncio
+import atexit
+import os
+import random
+import socket
+import stat
+import string
+import tempfile
+import time
+from copy import deepcopy
+
+import msgpack
+from channels.exceptions import ChannelFull
+from channels.layers import InMemoryChannelLayer
+
+# Largest datagram a process will send or accept; chat events are a few
+# hundred bytes, so many of them share one datagram.
+MAX_FRAME = 256 * 1024
+SOCKET_BUFFER = 4 * 1024 * 1024
+# Queued bytes per peer before it counts as full
+MAX_BACKLOG = 4 * 1024 * 1024
+
+
+class UnixSocketChannelLayer(InMemoryChannelLayer):
+    """
+    Channel layer for several worker processes on one host, without Redis.
+
+    Each process that owns channels binds a Unix datagram socket in ``path``,
+    and its specific channel names carry its socket name. A send goes straight
+    to the owning process. A group send reaches this process's members
+    directly and is passed once to every other live process, which fans it
+    out to its own members. Frames queued for a process while the event loop
+    is busy go out together, several per datagram, and in order. Capacity
+    (including ``channel_capacity`` patterns) and expiry are enforced by the
+    receiving process. ``path`` must be a directory private to this user. A
+    process whose socket stays full for ``send_timeout`` seconds counts as
+    full. Normal (non-specific) channels stay local to the process that uses
+    them.
+    """
+
+    def __init__(
+        self,
+        path=None,
+        send_timeout=1.0,
+        expiry=60,
+        group_expiry=86400,
+        capacity=100,
+        channel_capacity=None,
+        **kwargs
+    ):
+        super().__init__(
+            expiry=expiry,
+            group_expiry=group_expiry,
+            capacity=capacity,
+            channel_capacity=channel_capacity,
+            **kwargs
+        )
+        # InMemoryChannelLayer keeps the raw mapping; get_capacity needs patterns
+        self.channel_capacity = self.compile_capacities(channel_capacity or {})
+        self.path = str(path or os.path.join(tempfile.gettempdir(), f"channels-{os.getuid()}"))
+        self.send_timeout = send_timeout
+        self.peer = "ipc%d%s" % (
+            os.getpid(),
+            "".join(random.choice(string.ascii_lowercase) for _ in range(6)),
+        )
+        self._socket = None
+        self._loop = None
+        self._buffer = bytearray(MAX_FRAME)
+        self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sender.setblocking(False)
+        self._sender.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER)
+        self._peers = []
+        self._peers_mtime = None
+        self._outbox = {}
+        self._flusher = None
+        self._flushing_peer = None
+
+    # Channel layer API
+
+    async def send(self, channel, message):
+        owner = self._owner(channel)
+        assert isinstance(message, dict), "message is not a dict"
+        assert self.valid_channel_name(channel), "Channel name not valid"
+        if owner is None or owner == self.peer:
+            assert "__asgi_channel__" not in message
+            if not self._enqueue(channel, deepcopy(message)):
+                raise ChannelFull(channel)
+            return
+        frame = self._pack("s", channel, message)
+        if owner in self._outbox or owner == self._flushing_peer:
+            # stay behind the group frames already queued for that process
+            if not self._queue(owner, frame):
+                raise ChannelFull(channel)
+        elif not await self._transmit(owner, frame):
+            raise ChannelFull(channel)
+
+    async def receive(self, channel):
+        self._bind()
+        return await super().receive(channel)
+
+    async def new_channel(self, prefix="specific."):
+        self._bind()
+        return "%s.%s!%s" % (
+            prefix,
+            self.peer,
+            "".join(random.choice(string.ascii_letters) for i in range(12)),
+        )
+
+    async def close(self):
+        if self._socket is not None:
+            if self._loop is not None and not self._loop.is_closed():
+                self._loop.remove_reader(self._socket.fileno())
+            self._unbind()
+
+    # Groups extension
+
+    async def group_add(self, group, channel):
+        owner = self._owner(channel)
+        if owner is None or owner == self.peer:
+            return await super().group_add(group, channel)
+        # membership lives with the process that owns the channel
+        assert self.valid_group_name(group), "Group name not valid"
+        assert self.valid_channel_name(channel), "Channel name not valid"
+        await self._transmit(owner, self._pack("a", group, channel))
+
+    async def group_discard(self, group, channel):
+        owner = self._owner(channel)
+        if owner is None or owner == self.peer:
+            return await super().group_discard(group, channel)
+        assert self.valid_channel_name(channel), "Invalid channel name"
+        assert self.valid_group_name(group), "Invalid group name"
+        await self._transmit(owner, self._pack("d", group, channel))
+
+    async def group_send(self, group, message):
+        await super().group_send(group, message)
+        frame = self._pack("g", group, message)
+        for peer in self._live_peers():
+            # a full process drops the message, as a full channel does
+            self._queue(peer, frame)
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # not the loop serving this process's channels (a sync caller's
+            # short-lived loop, say), so don't leave frames behind
+            await self._flush_outbox()
+        elif self._flusher is None:
+            self._flusher = loop.create_task(self._flush_outbox())
+
+    # Transport
+
+    def _owner(self, channel):
+        if "!" not in channel:
+            return None
+        return channel.split("!", 1)[0].rsplit(".", 1)[-1]
+
+    def _address(self, peer):
+        return os.path.join(self.path, f"{peer}.sock")
+
+    def _pack(self, op, target, payload):
+        frame = msgpack.packb([op, target, payload], use_bin_type=True)
+        if len(frame) > MAX_FRAME:
+            raise ValueError(f"channel message exceeds {MAX_FRAME} bytes")
+        return frame
+
+    def _queue(self, peer, frame):
+        queued = self._outbox.setdefault(peer, [[], 0])
+        if queued[1] + len(frame) > MAX_BACKLOG:
+            return False
+        queued[0].append(frame)
+        queued[1] += len(frame)
+        return True
+
+    async def _flush_outbox(self):
+        """
+        Send queued frames, one peer at a time and as few datagrams as fit;
+        frames queued meanwhile are picked up before returning.
+        """
+        try:
+            while self._outbox:
+                peer = next(iter(self._outbox))
+                frames, _ = self._outbox.pop(peer)
+                self._flushing_peer = peer
+                chunk, size = [], 0
+                for frame in frames:
+                    if chunk and size + len(frame) > MAX_FRAME:
+                        if not await self._transmit(peer, b"".join(chunk)):
+                            chunk = None
+                            break
+                        chunk, size = [], 0
+                    chunk.append(frame)
+                    size += len(frame)
+                if chunk:
+                    await self._transmit(peer, b"".join(chunk))
+        finally:
+            self._flushing_peer = None
+            self._flusher = None
+
+    async def _transmit(self, peer, frame):
+        """
+        Send one frame to ``peer``; False if its socket stayed full. A peer
+        that has gone away counts as delivered: its channels went with it.
+        """
+        delay = 0.001
+        deadline = None
+        while True:
+            try:
+                self._sender.sendto(frame, self._address(peer))
+                return True
+            except FileNotFoundError:
+                self._peers_mtime = None
+                return True
+            except ConnectionRefusedError:
+                # socket file left behind by a process that died
+                try:
+                    os.unlink(self._address(peer))
+                except FileNotFoundError:
+                    pass
+                return True
+            except BlockingIOError:
+                now = time.monotonic()
+                if deadline is None:
+                    deadline = now + self.send_timeout
+                elif now >= deadline:
+                    return False
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.05)
+
+    def _live_peers(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return []
+        # directory timestamps are coarse, so a change made in the last few
+        # milliseconds may not have moved mtime yet
+        if mtime != self._peers_mtime or time.time_ns() - mtime < 50_000_000:
+            self._peers_mtime = mtime
+            self._peers = [
+                name[:-5]
+                for name in os.listdir(self.path)
+                if name.endswith(".sock") and name[:-5] != self.peer
+            ]
+        return self._peers
+
+    def _bind(self):
+        """
+        Bind this process's socket on first use and read it from the running
+        event loop (again, if the loop it was read from has closed).
+        """
+        if self._socket is None:
+            os.makedirs(self.path, mode=0o700, exist_ok=True)
+            self._check_path()
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER)
+            sock.bind(self._address(self.peer))
+            self._socket = sock
+            atexit.register(self._unbind)
+        if self._loop is None or self._loop.is_closed():
+            self._loop = asyncio.get_running_loop()
+            self._loop.add_reader(self._socket.fileno(), self._drain)
+
+    def _check_path(self):
+        """
+        Every frame, chat text included, passes through sockets in ``path``,
+        so it must be a private directory of this user: one that someone else
+        created first (or links elsewhere) could hold their sockets.
+        """
+        info = os.lstat(self.path)
+        if not stat.S_ISDIR(info.st_mode):
+            raise PermissionError(f"channel socket path {self.path} is not a directory")
+        if info.st_uid != os.getuid():
+            raise PermissionError(f"channel socket directory {self.path} is owned by another user")
+        if info.st_mode & 0o077:
+            raise PermissionError(
+                f"channel socket directory {self.path} is accessible to other users "
+                f"(mode {stat.S_IMODE(info.st_mode):o}); it must be 0700"
+            )
+
+    def _unbind(self):
+        if self._socket is None:
+            return
+        self._socket.close()
+        self._socket = None
+        self._loop = None
+        try:
+            os.unlink(self._address(self.peer))
+        except FileNotFoundError:
+            pass
+
+    def _drain(self):
+        self._clean_expired()
+        while self._socket is not None:
+            try:
+                size = self._socket.recv_into(self._buffer)
+            except (BlockingIOError, InterruptedError):
+                return
+            unpacker = msgpack.Unpacker(raw=False, max_buffer_size=MAX_FRAME)
+            unpacker.feed(self._buffer[:size])
+            for op, target, payload in unpacker:
+                self._apply(op, target, payload)
+
+    def _apply(self, op, target, payload):
+        if op == "s":
+            self._enqueue(target, payload)
+        elif op == "g":
+            for channel in list(self.groups.get(target, ())):
+                self._enqueue(channel, payload)
+        elif op == "a":
+            self.groups.setdefault(target, {})[payload] = time.time()
+        elif op == "d":
+            members = self.groups.get(target)
+            if members is not None:
+                members.pop(payload, None)
+                if not members:
+                    del self.groups[target]
+
+    def _enqueue(self, channel, message):
+        queue = self.channels.setdefault(channel, asyncio.Queue())
+        if queue.qsize() >= self.get_capacity(channel):
+            return False
+        queue.put_nowait((time.time() + self.expiry, message))
+        return True
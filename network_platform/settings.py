@@ -56,6 +56,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'profiles.middleware.ProfileMiddleware',
     'allauth.account.middleware.AccountMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
@@ -206,8 +207,44 @@ if REDIS_URL:
             "CONFIG": {"hosts": [REDIS_URL]},
         }
     }
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
 else:
-    # In-memory layer for single-process dev fallback (no Redis running)
+    # No Redis: worker processes on this host exchange events over Unix
+    # sockets in CHANNEL_SOCKET_DIR (a per-user temp directory by default)
     CHANNEL_LAYERS = {
-        "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+        "default": {
+            "BACKEND": "network_platform.channel_layers.UnixSocketChannelLayer",
+            "CONFIG": {"path": os.getenv("CHANNEL_SOCKET_DIR")},
+        }
     }
+    # ...and share cache state (version keys, id worker leases, drafts,
+    # presence) through the database; the table is created by messaging's
+    # migrations. Past MAX_ENTRIES rows the cache culls arbitrary keys,
+    # leases and pending drafts included, so it is sized far above the few
+    # keys per active user and conversation it holds.
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "django_cache",
+            "OPTIONS": {"MAX_ENTRIES": int(os.getenv("CACHE_MAX_ENTRIES", "1000000"))},
+        }
+    }
+
+# Messaging presence (heartbeats expire after PRESENCE_TTL seconds; the inbox
+# socket heartbeats at half that), kept in the shared cache
+PRESENCE_TTL = 30
+PRESENCE_BACKEND = "messaging.presence.CachePresenceBackend"
+
+# Message archive: `manage.py archive_messages` moves whole months older than
+# MESSAGE_HOT_DAYS out of messaging_message into compressed segments here
+MESSAGE_HOT_DAYS = int(os.getenv("MESSAGE_HOT_DAYS", "180"))
+MESSAGE_ARCHIVE_DIR = Path(os.getenv("MESSAGE_ARCHIVE_DIR", BASE_DIR / "archive" / "messages"))
+
+# Chat message ids embed a worker slot. Each process leases a free slot from
+# the shared cache; pin one here only if it is unique per running process.
+MESSAGE_WORKER_ID = os.getenv("MESSAGE_WORKER_ID")
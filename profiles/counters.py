@@ -0,0 +1,111 @@
+import atexit
+import logging
+import threading
+from collections import defaultdict
+
+from django.db import close_old_connections, transaction
+from django.db.models import F
+
+from .models import Profile
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCounterBuffer:
+    """
+    Write-behind buffer for ``Profile.views``. Hits are summed in memory and
+    flushed as ``views = views + delta`` UPDATEs (one per distinct delta) by a
+    timer thread every ``flush_interval`` seconds, or as soon as
+    ``max_pending`` hits accumulate, and at interpreter exit. ``incr`` never
+    touches the database. Readers add ``pending(pk)``, which counts hits
+    queued and in flight, so counts stay current; a failed flush is logged
+    and its hits go back in the queue for the next one.
+    """
+
+    def __init__(self, flush_interval=5.0, max_pending=500):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._deltas = defaultdict(int)
+        self._inflight = defaultdict(int)
+        self._total = 0
+        self._timer = None
+        self._urgent = False
+        self._failing = False
+
+    def incr(self, pk, amount=1):
+        with self._lock:
+            self._deltas[pk] += amount
+            self._total += amount
+            if self._total >= self.max_pending and not self._urgent and not self._failing:
+                # over the threshold: have the timer thread flush right away
+                if self._timer is not None:
+                    self._timer.cancel()
+                self._start_timer(0)
+                self._urgent = True
+            elif self._timer is None:
+                self._start_timer(self.flush_interval)
+
+    def pending(self, pk):
+        with self._lock:
+            return self._deltas.get(pk, 0) + self._inflight.get(pk, 0)
+
+    def _start_timer(self, delay):
+        self._timer = threading.Timer(delay, self._flush_from_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("flushing profile view counts failed, retrying in %ss", self.flush_interval)
+        finally:
+            close_old_connections()
+
+    def flush(self):
+        with self._lock:
+            deltas, self._deltas = self._deltas, defaultdict(int)
+            self._total = 0
+            self._urgent = False
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            for pk, delta in deltas.items():
+                self._inflight[pk] += delta
+        if not deltas:
+            return
+        by_delta = defaultdict(list)
+        for pk, delta in deltas.items():
+            by_delta[delta].append(pk)
+        try:
+            with transaction.atomic():
+                for delta, pks in by_delta.items():
+                    Profile.objects.filter(pk__in=pks).update(views=F("views") + delta)
+        except Exception:
+            # Put the hits back so the next flush retries them; until one
+            # succeeds, retries wait for the timer rather than the threshold
+            with self._lock:
+                self._settle(deltas)
+                for pk, delta in deltas.items():
+                    self._deltas[pk] += delta
+                    self._total += delta
+                self._failing = True
+                if self._timer is None:
+                    self._start_timer(self.flush_interval)
+            raise
+        with self._lock:
+            self._settle(deltas)
+            self._failing = False
+
+    def _settle(self, deltas):
+        for pk, delta in deltas.items():
+            left = self._inflight[pk] - delta
+            if left:
+                self._inflight[pk] = left
+            else:
+                del self._inflight[pk]
+
+
+view_counter = ViewCounterBuffer()
+atexit.register(view_counter.flush)
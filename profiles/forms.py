@@ -1,8 +1,11 @@
 from django import forms
-from datetime import date
 
 from django.forms import modelformset_factory
+from . import quota
 from .models import Profile, Experience
+from .search import refresh_search_document
+from .ranking import ranking_engine
+from .skills import sync_profile_skills
 
 
 class ProfileForm(forms.ModelForm):
@@ -29,6 +32,9 @@ class ProfileForm(forms.ModelForm):
             "profile_picture": forms.FileInput(attrs={"class": "file-input"}),
         }
 
+    # Columns the form writes; the tier goes through quota.change_tier
+    PROFILE_FIELDS = ["headline", "about", "location", "profile_picture", "role", "skills", "updated"]
+
     def __init__(self, *args, **kwargs):
         user = kwargs.pop("user", None)
         super().__init__(*args, **kwargs)
@@ -52,26 +58,23 @@ class ProfileForm(forms.ModelForm):
 
     def save(self, user, commit=True):
         profile = super().save(commit=False)
-        limit_before = profile.connection_limit
         skills_raw = self.cleaned_data.get("skills_text", "")
         profile.skills = [s.strip() for s in skills_raw.split(",") if s.strip()]
-        # Reset remaining to limit if tier changed and has a numeric cap
-        new_limit = profile.connection_limit
-        if self._initial_tier != profile.membership_tier:
-            if new_limit is not None:
-                used = 0
-                if limit_before is not None:
-                    used = max(limit_before - profile.remaining_connections, 0)
-                profile.remaining_connections = max(new_limit - used, 0)
-                profile.last_connection_reset = date.today()
-            else:
-                # Pro tier: remaining not enforced
-                profile.remaining_connections = profile.remaining_connections
+        tier = profile.membership_tier
         if commit:
-            profile.save()
+            # Only the edited columns: the quota and counters on this instance
+            # were read at request start and may have moved since.
+            profile.save(update_fields=self.PROFILE_FIELDS)
+            if tier != self._initial_tier:
+                profile.membership_tier = self._initial_tier
+                quota.change_tier(profile, tier)
         user.first_name = self.cleaned_data.get("first_name", user.first_name)
         user.last_name = self.cleaned_data.get("last_name", user.last_name)
         user.save(update_fields=["first_name", "last_name"])
+        if commit:
+            refresh_search_document(profile)
+            sync_profile_skills(profile)
+            ranking_engine.update(profile)
         return profile
 
 
@@ -0,0 +1,216 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+
+from django.core.cache import cache
+
+from .models import Connection
+
+GRAPH_VERSION_KEY = "profiles:connection_graph_version"
+GRAPH_CHANGE_KEY = "profiles:connection_graph_change:{}"
+# How long a write's change entry stays for other workers to replay, and the
+# most entries a worker replays before it reloads the whole graph instead
+CHANGE_TTL = 3600
+MAX_REPLAY = 1000
+
+
+def _change_key(version):
+    return GRAPH_CHANGE_KEY.format(version)
+
+
+def _contains(ids, pk):
+    i = bisect_left(ids, pk)
+    return i < len(ids) and ids[i] == pk
+
+
+def _add(index, key, pk):
+    ids = index.get(key)
+    if ids is None:
+        index[key] = array("q", [pk])
+    elif not _contains(ids, pk):
+        insort(ids, pk)
+
+
+def _discard(index, key, pk):
+    ids = index.get(key)
+    if ids is None:
+        return
+    i = bisect_left(ids, pk)
+    if i < len(ids) and ids[i] == pk:
+        del ids[i]
+        if not ids:
+            del index[key]
+
+
+class ConnectionGraph:
+    """
+    Adjacency lists of profile ids for accepted (undirected) and pending
+    (directed) connections, each a sorted ``array('q')`` so membership is a
+    bisect and memory stays at eight bytes per edge end.
+    Loaded lazily per process. Each write takes the next version in the
+    shared cache and records its change under it; other workers compare
+    versions at most every ``recheck`` seconds and replay the changes they
+    missed, reloading only when those are gone or too many.
+    """
+
+    def __init__(self, recheck=1.0):
+        self.recheck = recheck
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._version = None
+        self._checked = 0.0
+        self._accepted = {}
+        self._outgoing = {}
+        self._incoming = {}
+
+    def _load(self):
+        accepted, outgoing, incoming = {}, {}, {}
+        rows = Connection.objects.values_list("requester_id", "receiver_id", "status")
+        for requester, receiver, status in rows.iterator():
+            if status == Connection.STATUS_ACCEPTED:
+                _add(accepted, requester, receiver)
+                _add(accepted, receiver, requester)
+            else:
+                _add(outgoing, requester, receiver)
+                _add(incoming, receiver, requester)
+        self._accepted, self._outgoing, self._incoming = accepted, outgoing, incoming
+        self._loaded = True
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if self._loaded and now - self._checked < self.recheck:
+            return
+        # no key yet (or evicted) reads as 0: changes recorded from then on
+        # still replay on top of a load taken now
+        version = cache.get(GRAPH_VERSION_KEY, 0)
+        with self._lock:
+            self._checked = now
+            if self._loaded and version == self._version:
+                return
+            if not (self._loaded and self._replay(version)):
+                self._version = version
+                self._load()
+
+    def _replay(self, version):
+        """
+        Apply the changes between our version and ``version``; False when
+        they can't be (a version reset, expired entries, too many).
+        """
+        if not 0 < version - self._version <= MAX_REPLAY:
+            return False
+        keys = [_change_key(v) for v in range(self._version + 1, version + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            return False
+        for key in keys:
+            self._apply(*changes[key])
+        self._version = version
+        return True
+
+    def _apply(self, op, a, b):
+        if op == "pending":
+            _add(self._outgoing, a, b)
+            _add(self._incoming, b, a)
+        elif op == "accept":
+            _discard(self._outgoing, a, b)
+            _discard(self._incoming, b, a)
+            _add(self._accepted, a, b)
+            _add(self._accepted, b, a)
+        else:
+            for x, y in ((a, b), (b, a)):
+                _discard(self._accepted, x, y)
+                _discard(self._outgoing, x, y)
+                _discard(self._incoming, x, y)
+
+    def _record(self, change):
+        # Every version holds exactly one change: the entry is claimed with
+        # add, and a version another worker got first is skipped
+        while True:
+            try:
+                version = cache.incr(GRAPH_VERSION_KEY)
+            except ValueError:
+                cache.add(GRAPH_VERSION_KEY, 0, None)
+                continue
+            if cache.add(_change_key(version), change, CHANGE_TTL):
+                break
+        with self._lock:
+            if self._loaded and version == self._version + 1:
+                self._version = version
+            # else the next read replays the changes in between, ours again
+
+    def _write(self, *change):
+        with self._lock:
+            if self._loaded:
+                self._apply(*change)
+        self._record(change)
+
+    # Writes
+
+    def add_pending(self, requester_id, receiver_id):
+        self._write("pending", requester_id, receiver_id)
+
+    def accept(self, requester_id, receiver_id):
+        self._write("accept", requester_id, receiver_id)
+
+    def remove(self, a, b):
+        self._write("remove", a, b)
+
+    # Reads
+
+    def neighbors(self, pk):
+        self._ensure_fresh()
+        return list(self._accepted.get(pk, ()))
+
+    def _status(self, pk, other):
+        if _contains(self._accepted.get(pk, ()), other):
+            return Connection.STATUS_ACCEPTED
+        if _contains(self._outgoing.get(pk, ()), other):
+            return Connection.STATUS_PENDING
+        if _contains(self._incoming.get(pk, ()), other):
+            return "incoming-pending"
+        return None
+
+    def status(self, pk, other):
+        """
+        Status of ``other`` from ``pk``'s side, matching Discover's labels.
+        """
+        self._ensure_fresh()
+        return self._status(pk, other)
+
+    def statuses(self, pk, others):
+        self._ensure_fresh()
+        statuses = {}
+        for other in others:
+            status = self._status(pk, other)
+            if status:
+                statuses[other] = status
+        return statuses
+
+    def mutual(self, a, b):
+        self._ensure_fresh()
+        return sorted(set(self._accepted.get(a, ())).intersection(self._accepted.get(b, ())))
+
+    def suggestions(self, pk, limit=5):
+        """
+        Second-degree profiles as (id, mutual count) pairs, most mutual
+        connections first, skipping anyone already connected or with a
+        pending request either way.
+        """
+        self._ensure_fresh()
+        with self._lock:
+            first = self._accepted.get(pk, ())
+            skip = set(first)
+            skip.update(self._outgoing.get(pk, ()))
+            skip.update(self._incoming.get(pk, ()))
+            skip.add(pk)
+            counts = Counter()
+            for friend in first:
+                for candidate in self._accepted.get(friend, ()):
+                    if candidate not in skip:
+                        counts[candidate] += 1
+        return sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+
+connection_graph = ConnectionGraph()
@@ -0,0 +1,71 @@
+import random
+import time
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+
+from profiles.models import Profile
+from profiles.ranking import RankingEngine
+
+SKILL_POOL = [f"skill-{i}" for i in range(400)] + [
+    "React", "Node.js", "Python", "AWS", "TypeScript", "Docker", "Django", "Go",
+]
+LOCATIONS = ["Berlin", "Paris", "London", "Remote", "New York", "Lagos", "Tokyo", ""]
+
+
+class Command(BaseCommand):
+    help = "Benchmark Discover top-k ranking latency on synthetic profiles (no database)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profiles", type=int, default=100_000)
+        parser.add_argument("--k", type=int, default=50)
+        parser.add_argument("--runs", type=int, default=50)
+        parser.add_argument("--seed", type=int, default=7)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        now = time.time()
+        roles = [Profile.ROLE_CLIENT, Profile.ROLE_DEVELOPER]
+        rows = [
+            (
+                pk,
+                rng.sample(SKILL_POOL, rng.randint(0, 8)),
+                rng.choice(LOCATIONS),
+                now - rng.uniform(0, 365 * 24 * 3600),
+                rng.choice(roles),
+            )
+            for pk in range(1, options["profiles"] + 1)
+        ]
+        # not shared: no cache round trips, so the figures are the engine's own
+        engine = RankingEngine(shared=False)
+        start = time.perf_counter()
+        engine.load(rows)
+        load_s = time.perf_counter() - start
+
+        timings = []
+        for _ in range(options["runs"]):
+            viewer = SimpleNamespace(
+                pk=rng.randint(1, options["profiles"]),
+                skills=rng.sample(SKILL_POOL, 5),
+                location=rng.choice(LOCATIONS),
+                role=rng.choice(roles),
+            )
+            start = time.perf_counter()
+            engine.top_k(viewer, k=options["k"])
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+
+        start = time.perf_counter()
+        for pk, skills, location, _, role in rows[:1000]:
+            engine.update(
+                SimpleNamespace(pk=pk, skills=skills, location=location, updated=None, role=role)
+            )
+        update_us = (time.perf_counter() - start) * 1_000_000 / 1000
+
+        self.stdout.write(f"profiles: {options['profiles']}  k: {options['k']}")
+        self.stdout.write(f"initial load: {load_s:.2f}s")
+        self.stdout.write(
+            f"top-{options['k']} latency: p50 {timings[len(timings) // 2]:.2f}ms "
+            f"p95 {timings[int(len(timings) * 0.95) - 1]:.2f}ms max {timings[-1]:.2f}ms"
+        )
+        self.stdout.write(f"incremental update: {update_us:.1f}us per profile")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from profiles.skills import recount_skills
+
+
+class Command(BaseCommand):
+    help = "Recompute Skill.profile_count from profile skill links."
+
+    def handle(self, *args, **options):
+        fixed = recount_skills()
+        self.stdout.write(self.style.SUCCESS(f"Corrected {fixed} skill counts."))
@@ -0,0 +1,62 @@
+from django.db import IntegrityError, transaction
+from django.utils.functional import SimpleLazyObject
+
+from .models import Profile
+from .ranking import ranking_engine
+from .search import refresh_search_document
+from .skills import sync_profile_skills
+
+NEW_PROFILE_DEFAULTS = {
+    "headline": "Full Stack Developer",
+    "bio": "About yourself",
+    "about": "About yourself",
+    "location": "",
+    "skills": ["React", "Node.js", "TypeScript", "PostgreSQL", "AWS"],
+}
+
+
+def create_profile(user):
+    """
+    Fallback for accounts that skipped signup (e.g. createsuperuser); regular
+    signups get their profile from ConnectSignupForm / allauth signals.
+    """
+    profile = Profile(user=user, **NEW_PROFILE_DEFAULTS)
+    try:
+        with transaction.atomic():
+            profile.save()
+    except IntegrityError:
+        return Profile.objects.select_related("user").get(user=user)
+    refresh_search_document(profile)
+    sync_profile_skills(profile)
+    ranking_engine.update(profile)
+    return profile
+
+
+def load_profile(user):
+    if not user or not user.is_authenticated:
+        return None
+    try:
+        return Profile.objects.select_related("user").get(user=user)
+    except Profile.DoesNotExist:
+        return create_profile(user)
+
+
+def get_request_profile(request):
+    if not hasattr(request, "_cached_profile"):
+        request._cached_profile = load_profile(getattr(request, "user", None))
+    return request._cached_profile
+
+
+class ProfileMiddleware:
+    """
+    Attaches a lazy ``request.profile`` for the signed-in user (None for
+    anonymous requests). It is loaded at most once per request, with its user
+    joined in, and shared by views, later middleware and templates.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.profile = SimpleLazyObject(lambda: get_request_profile(request))
+        return self.get_response(request)
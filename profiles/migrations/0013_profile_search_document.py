@@ -0,0 +1,59 @@
+from django.db import migrations, models
+
+
+def backfill_search_document(apps, schema_editor):
+    Profile = apps.get_model("profiles", "Profile")
+    for profile in Profile.objects.select_related("user").iterator():
+        user = profile.user
+        full_name = f"{user.first_name} {user.last_name}".strip()
+        parts = [
+            full_name,
+            user.username,
+            profile.headline,
+            profile.location,
+            " ".join(profile.skills or []),
+        ]
+        document = " ".join(p for p in parts if p).lower()
+        Profile.objects.filter(pk=profile.pk).update(search_document=document)
+
+
+def create_postgres_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "ALTER TABLE profiles_profile ADD COLUMN search_vector tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('simple', search_document)) STORED"
+    )
+    schema_editor.execute(
+        "CREATE INDEX profiles_profile_search_vector_gin "
+        "ON profiles_profile USING gin (search_vector)"
+    )
+    schema_editor.execute(
+        "CREATE INDEX profiles_profile_search_document_trgm "
+        "ON profiles_profile USING gin (search_document gin_trgm_ops)"
+    )
+
+
+def drop_postgres_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS profiles_profile_search_document_trgm")
+    schema_editor.execute("ALTER TABLE profiles_profile DROP COLUMN IF EXISTS search_vector")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0012_profile_message_available_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(backfill_search_document, migrations.RunPython.noop),
+        migrations.RunPython(create_postgres_indexes, drop_postgres_indexes),
+    ]
@@ -0,0 +1,69 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_skills(apps, schema_editor):
+    Profile = apps.get_model("profiles", "Profile")
+    Skill = apps.get_model("profiles", "Skill")
+    ProfileSkill = apps.get_model("profiles", "ProfileSkill")
+    skills = {}
+    links = []
+    for profile_id, raw_skills in Profile.objects.values_list("pk", "skills").iterator():
+        seen = set()
+        for raw in raw_skills or []:
+            display = " ".join(str(raw or "").split())[:100]
+            key = display.casefold()
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            if key not in skills:
+                skills[key] = Skill(key=key, name=display, profile_count=0)
+            skills[key].profile_count += 1
+            links.append((profile_id, key))
+    Skill.objects.bulk_create(skills.values(), batch_size=1000)
+    ids = dict(Skill.objects.values_list("key", "pk"))
+    ProfileSkill.objects.bulk_create(
+        [ProfileSkill(profile_id=profile_id, skill_id=ids[key]) for profile_id, key in links],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0013_profile_search_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Skill',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('key', models.CharField(max_length=100, unique=True)),
+                ('profile_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProfileSkill',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='skill_links', to='profiles.profile')),
+                ('skill', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='profile_links', to='profiles.skill')),
+            ],
+            options={
+                'unique_together': {('profile', 'skill')},
+                'indexes': [models.Index(fields=['skill', 'profile'], name='profileskill_skill_profile_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='skill',
+            name='profiles',
+            field=models.ManyToManyField(related_name='skill_tags', through='profiles.ProfileSkill', to='profiles.profile'),
+        ),
+        migrations.AddIndex(
+            model_name='skill',
+            index=models.Index(fields=['-profile_count', 'key'], name='skill_popularity_idx'),
+        ),
+        migrations.RunPython(backfill_skills, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0014_skill_profileskill'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='connection',
+            name='low',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='profiles.profile'),
+        ),
+        migrations.AddField(
+            model_name='connection',
+            name='high',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='profiles.profile'),
+        ),
+    ]
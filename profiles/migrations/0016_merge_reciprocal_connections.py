@@ -0,0 +1,45 @@
+from django.db import migrations
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+
+def merge_reciprocal_connections(apps, schema_editor):
+    """
+    Fill low/high and collapse A->B / B->A rows into the oldest one. The pair
+    stays accepted if either row was; counters are corrected for accepted
+    duplicates, which had each bumped active_connections.
+    """
+    Connection = apps.get_model("profiles", "Connection")
+    Profile = apps.get_model("profiles", "Profile")
+    keep = {}
+    for conn in Connection.objects.order_by("created", "pk").iterator():
+        low, high = sorted((conn.requester_id, conn.receiver_id))
+        kept = keep.get((low, high))
+        if kept is None:
+            conn.low_id, conn.high_id = low, high
+            keep[(low, high)] = conn
+            Connection.objects.filter(pk=conn.pk).update(low_id=low, high_id=high)
+            continue
+        if conn.status == "accepted":
+            if kept.status == "accepted":
+                Profile.objects.filter(pk__in=[low, high]).update(
+                    active_connections=Greatest(F("active_connections") - 1, 0)
+                )
+            else:
+                kept.status = "accepted"
+                Connection.objects.filter(pk=kept.pk).update(status="accepted")
+        conn.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0015_connection_canonical_pair'),
+    ]
+
+    # Data only: on PostgreSQL the rows it touches leave deferred FK triggers
+    # pending, and the table can't be altered in the same transaction, so the
+    # NOT NULL and unique pair come in 0017.
+    operations = [
+        migrations.RunPython(merge_reciprocal_connections, migrations.RunPython.noop),
+    ]
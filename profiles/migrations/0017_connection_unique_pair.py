@@ -0,0 +1,30 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0016_merge_reciprocal_connections'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='connection',
+            name='low',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='profiles.profile'),
+        ),
+        migrations.AlterField(
+            model_name='connection',
+            name='high',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='profiles.profile'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='connection',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='connection',
+            constraint=models.UniqueConstraint(fields=('low', 'high'), name='connection_unique_pair'),
+        ),
+    ]
@@ -4,6 +4,9 @@ from django.utils import timezone
 from datetime import date
 
 
+TIER_CONNECTION_LIMITS = {"common": 2, "plus": 5, "pro": None}  # pro = unlimited
+
+
 def avatar_upload_path(instance, filename):
     return f"avatars/{instance.user.username}/{filename}"
 
@@ -48,6 +51,8 @@ class Profile(models.Model):
     active_connections = models.PositiveIntegerField(default=0)
     remaining_connections = models.PositiveIntegerField(default=2)
     last_connection_reset = models.DateField(blank=True, null=True)
+    # Lower-cased name/headline/location/skills, see profiles.search
+    search_document = models.TextField(blank=True, default="", editable=False)
 
     def __str__(self):
         return f"Profile({self.user.username})"
@@ -57,22 +62,20 @@ class Profile(models.Model):
 
     @property
     def connection_limit(self):
-        if self.membership_tier == "common":
-            return 2
-        if self.membership_tier == "plus":
-            return 5
-        return None  # pro = unlimited
+        return TIER_CONNECTION_LIMITS.get(self.membership_tier)
 
-    def reset_daily_connections(self, save=True):
+    @property
+    def remaining_today(self):
+        """
+        Connects left today. A stored count from an earlier day is stale, so
+        the allowance resets on read instead of by a nightly or lazy write.
+        """
         limit = self.connection_limit
         if limit is None:
-            return
-        today = date.today()
-        if self.last_connection_reset != today:
-            self.remaining_connections = limit
-            self.last_connection_reset = today
-            if save:
-                self.save(update_fields=["remaining_connections", "last_connection_reset"])
+            return None
+        if self.last_connection_reset != date.today():
+            return limit
+        return min(self.remaining_connections, limit)
 
 
 class Experience(models.Model):
@@ -95,7 +98,39 @@ class Experience(models.Model):
         return f"{self.title} @ {self.company or '—'}"
 
 
+def ordered_pair(a, b):
+    a = getattr(a, "pk", a)
+    b = getattr(b, "pk", b)
+    return (a, b) if a <= b else (b, a)
+
+
+class ConnectionQuerySet(models.QuerySet):
+    def between(self, a, b):
+        """
+        The edge between two profiles in either direction: one probe on the
+        unique (low, high) index.
+        """
+        low, high = ordered_pair(a, b)
+        return self.filter(low_id=low, high_id=high)
+
+    def get_or_create(self, defaults=None, **kwargs):
+        # Callers still pass requester/receiver; resolve them to the
+        # canonical pair so a reverse request finds the existing edge.
+        if "requester" in kwargs and "receiver" in kwargs:
+            requester = kwargs.pop("requester")
+            receiver = kwargs.pop("receiver")
+            low, high = ordered_pair(requester, receiver)
+            defaults = {"requester": requester, "receiver": receiver, **(defaults or {})}
+            kwargs.update(low_id=low, high_id=high)
+        return super().get_or_create(defaults=defaults, **kwargs)
+
+
 class Connection(models.Model):
+    """
+    One row per pair of profiles. ``low``/``high`` hold the pair in id order
+    and are unique together; ``requester``/``receiver`` keep the direction.
+    """
+
     STATUS_PENDING = "pending"
     STATUS_ACCEPTED = "accepted"
     STATUS_CHOICES = [
@@ -109,13 +144,60 @@ class Connection(models.Model):
     receiver = models.ForeignKey(
         Profile, related_name="received_connections", on_delete=models.CASCADE
     )
+    low = models.ForeignKey(Profile, related_name="+", on_delete=models.CASCADE)
+    high = models.ForeignKey(Profile, related_name="+", on_delete=models.CASCADE)
     status = models.CharField(
         max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING
     )
     created = models.DateTimeField(auto_now_add=True)
 
+    objects = ConnectionQuerySet.as_manager()
+
     class Meta:
-        unique_together = ("requester", "receiver")
+        constraints = [
+            models.UniqueConstraint(fields=["low", "high"], name="connection_unique_pair"),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.low_id, self.high_id = ordered_pair(self.requester_id, self.receiver_id)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.requester} -> {self.receiver} ({self.status})"
+
+
+class Skill(models.Model):
+    """
+    Canonical skill vocabulary; ``key`` is the case-folded name used for
+    lookups and ``profile_count`` is kept in step by profiles.skills (and
+    ``recount_skills`` repairs it).
+    """
+
+    name = models.CharField(max_length=100)
+    key = models.CharField(max_length=100, unique=True)
+    profile_count = models.PositiveIntegerField(default=0)
+    profiles = models.ManyToManyField(
+        Profile, through="ProfileSkill", related_name="skill_tags"
+    )
+
+    class Meta:
+        indexes = [models.Index(fields=["-profile_count", "key"], name="skill_popularity_idx")]
+
+    def __str__(self):
+        return self.name
+
+
+class ProfileSkill(models.Model):
+    profile = models.ForeignKey(
+        Profile, related_name="skill_links", on_delete=models.CASCADE
+    )
+    skill = models.ForeignKey(
+        Skill, related_name="profile_links", on_delete=models.CASCADE
+    )
+
+    class Meta:
+        unique_together = ("profile", "skill")
+        indexes = [models.Index(fields=["skill", "profile"], name="profileskill_skill_profile_idx")]
+
+    def __str__(self):
+        return f"{self.profile} - {self.skill}"
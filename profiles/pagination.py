@@ -0,0 +1,51 @@
+from django.db.models import Q
+
+DISCOVER_PAGE_SIZE = 20
+
+
+def parse_cursor(raw):
+    """
+    Cursors are "<pk>" or "<rank>:<pk>" for relevance-ordered pages; anything
+    malformed means "first page".
+    """
+    if not raw:
+        return None
+    rank, _, pk = str(raw).rpartition(":")
+    try:
+        pk = int(pk)
+        rank = float(rank) if rank else None
+    except ValueError:
+        return None
+    return (rank, pk) if pk > 0 else None
+
+
+def keyset_page(queryset, cursor=None, page_size=DISCOVER_PAGE_SIZE, rank_field=None):
+    """
+    Return one page of ``queryset`` and the cursor for the following page
+    (None when exhausted).
+    Rows are ordered newest-first by primary key, or by ``rank_field`` then
+    primary key for search results. Pages seek past the cursor instead of
+    using OFFSET so every page costs the same no matter how deep the user
+    scrolls.
+    """
+    if rank_field:
+        qs = queryset.order_by(f"-{rank_field}", "-pk")
+    else:
+        qs = queryset.order_by("-pk")
+    if cursor is not None:
+        rank, pk = cursor
+        if rank_field and rank is not None:
+            qs = qs.filter(
+                Q(**{f"{rank_field}__lt": rank}) | Q(**{rank_field: rank, "pk__lt": pk})
+            )
+        else:
+            qs = qs.filter(pk__lt=pk)
+    rows = list(qs[: page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        last = rows[page_size - 1]
+        if rank_field:
+            next_cursor = f"{getattr(last, rank_field)!r}:{last.pk}"
+        else:
+            next_cursor = str(last.pk)
+    return rows[:page_size], next_cursor
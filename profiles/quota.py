@@ -0,0 +1,96 @@
+from datetime import date
+
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+
+from .models import TIER_CONNECTION_LIMITS, Profile
+
+
+def _limit_expression():
+    return Case(
+        *[
+            When(membership_tier=tier, then=Value(limit))
+            for tier, limit in TIER_CONNECTION_LIMITS.items()
+            if limit is not None
+        ],
+        default=Value(0),
+    )
+
+
+def try_consume(profile):
+    """
+    Spend one connect for today in a single conditional UPDATE; returns False
+    once the allowance is used up. Concurrent calls serialize on the row lock
+    and re-check the condition, so the quota can never be overspent.
+    """
+    if profile.connection_limit is None:
+        return True
+    today = date.today()
+    updated = (
+        Profile.objects.filter(pk=profile.pk)
+        .exclude(membership_tier="pro")
+        .filter(
+            Q(last_connection_reset=today, remaining_connections__gt=0)
+            | ~Q(last_connection_reset=today)
+        )
+        .update(
+            remaining_connections=Case(
+                When(last_connection_reset=today, then=F("remaining_connections") - 1),
+                default=_limit_expression() - 1,
+            ),
+            last_connection_reset=today,
+        )
+    )
+    if updated:
+        profile.remaining_connections = profile.remaining_today - 1
+        profile.last_connection_reset = today
+    return bool(updated)
+
+
+def refund(profile):
+    """
+    Give back a connect taken by ``try_consume`` when no request was created.
+    """
+    if profile.connection_limit is None:
+        return
+    today = date.today()
+    updated = Profile.objects.filter(pk=profile.pk, last_connection_reset=today).update(
+        remaining_connections=F("remaining_connections") + 1
+    )
+    if updated:
+        profile.remaining_connections += 1
+
+
+def change_tier(profile, tier):
+    """
+    Move to ``tier`` keeping today's usage: someone who spent one of two
+    connects on Common has four of five left on Plus.
+    """
+    with transaction.atomic():
+        locked = Profile.objects.select_for_update().get(pk=profile.pk)
+        current_limit = locked.connection_limit
+        remaining = locked.remaining_today
+        used = 0 if current_limit is None else max(current_limit - remaining, 0)
+        locked.membership_tier = tier
+        new_limit = locked.connection_limit
+        if new_limit is not None:
+            locked.remaining_connections = max(new_limit - used, 0)
+        locked.last_connection_reset = date.today()
+        locked.save(
+            update_fields=["membership_tier", "remaining_connections", "last_connection_reset"]
+        )
+    profile.membership_tier = locked.membership_tier
+    profile.remaining_connections = locked.remaining_connections
+    profile.last_connection_reset = locked.last_connection_reset
+    return profile
+
+
+def quota_stats(profile):
+    limit = profile.connection_limit
+    remaining = profile.remaining_today
+    return {
+        "daily_limit": "∞" if limit is None else limit,
+        "remaining": "∞" if limit is None else remaining,
+        "remaining_display": "∞" if limit is None else f"{remaining}/{limit}",
+        "tier": profile.membership_tier,
+    }
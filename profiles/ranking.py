@@ -0,0 +1,289 @@
+import threading
+import time
+import zlib
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Profile
+from .skills import canonical_skill
+
+SKILL_BITS = 256
+RECENCY_HALF_LIFE = 30 * 24 * 3600
+WEIGHT_SKILLS = 0.6
+WEIGHT_LOCATION = 0.25
+WEIGHT_RECENCY = 0.15
+ROLE_CODES = {Profile.ROLE_CLIENT: 1, Profile.ROLE_DEVELOPER: 2}
+RANKING_VERSION_KEY = "profiles:ranking_version"
+RANKING_CHANGE_KEY = "profiles:ranking_change:{}"
+# How long a write's changed pk stays for other workers to re-read, and the
+# most changes a worker catches up on before it reloads every row instead
+CHANGE_TTL = 3600
+MAX_REPLAY = 1000
+
+
+def _change_key(version):
+    return RANKING_CHANGE_KEY.format(version)
+
+
+def _stable_hash(text):
+    return zlib.crc32(text.encode("utf-8"))
+
+
+def skill_bits(skills):
+    """
+    Hash canonical skill keys into SKILL_BITS buckets; returns the 0/1 vector
+    and the number of distinct skills.
+    """
+    bits = np.zeros(SKILL_BITS, dtype=np.uint8)
+    keys = set()
+    for raw in skills or []:
+        _, key = canonical_skill(raw)
+        if key:
+            bits[_stable_hash(key) % SKILL_BITS] = 1
+            keys.add(key)
+    return bits, len(keys)
+
+
+def location_key(location):
+    location = " ".join((location or "").split()).casefold()
+    return _stable_hash(location) if location else 0
+
+
+class RankingEngine:
+    """
+    Column store of every profile's ranking features, scored for a viewer in
+    one vectorized pass: skill overlap, exact location match and exponential
+    recency of ``Profile.updated``.
+    Skills are a bit matrix packed along the profile axis (one bit per
+    profile per hashed skill bucket), so overlap only unpacks the handful of
+    rows for the viewer's own skills. Rows are loaded once per process and
+    patched by ``update``/``remove`` on edits. With ``shared`` (the default)
+    each edit also takes the next version in the shared cache and records
+    its pk under it; other workers compare versions at most every
+    ``recheck`` seconds and re-read just the profiles that changed, reloading
+    every row only when those records are gone or too many.
+    """
+
+    def __init__(self, capacity=1024, shared=True, recheck=1.0):
+        # capacity stays a multiple of 8 so packed skill columns line up
+        self.shared = shared
+        self.recheck = recheck
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._loaded = False
+        self._version = None
+        self._checked = 0.0
+        self._size = 0
+        self._row_of = {}
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.skills = np.zeros((SKILL_BITS, capacity // 8), dtype=np.uint8)
+        self.locations = np.zeros(capacity, dtype=np.uint32)
+        self.updated = np.zeros(capacity, dtype=np.float64)
+        self.roles = np.zeros(capacity, dtype=np.int8)
+        self.alive = np.zeros(capacity, dtype=bool)
+
+    def _grow(self):
+        old_skills = self.skills
+        old = (self.ids, self.locations, self.updated, self.roles, self.alive)
+        self._allocate(len(self.ids) * 2)
+        self.skills[:, : old_skills.shape[1]] = old_skills
+        for new_arr, old_arr in zip(
+            (self.ids, self.locations, self.updated, self.roles, self.alive), old
+        ):
+            new_arr[: len(old_arr)] = old_arr
+
+    def _set_row(self, pk, skills, location, updated_ts, role):
+        row = self._row_of.get(pk)
+        if row is None:
+            if self._size == len(self.ids):
+                self._grow()
+            row = self._size
+            self._size += 1
+            self._row_of[pk] = row
+        self.ids[row] = pk
+        bits, _ = skill_bits(skills)
+        mask = np.uint8(1 << (7 - (row & 7)))
+        column = self.skills[:, row >> 3]
+        self.skills[:, row >> 3] = (column & ~mask) | (bits * mask)
+        self.locations[row] = location_key(location)
+        self.updated[row] = updated_ts
+        self.roles[row] = ROLE_CODES.get(role, 0)
+        self.alive[row] = True
+
+    def load(self, rows):
+        """
+        Bulk load ``(pk, skills, location, updated_ts, role)`` tuples.
+        """
+        with self._lock:
+            for row in rows:
+                self._set_row(*row)
+            self._loaded = True
+
+    def _rows(self, queryset):
+        rows = queryset.values_list("pk", "skills", "location", "updated", "role")
+        return ((pk, s, loc, upd.timestamp(), role) for pk, s, loc, upd, role in rows.iterator())
+
+    def _reload(self, pks=None):
+        """
+        Re-read ``pks`` (every profile when None) and retire the rows among
+        them whose profile is gone.
+        """
+        queryset = Profile.objects.all() if pks is None else Profile.objects.filter(pk__in=pks)
+        seen = set()
+
+        def rows():
+            for row in self._rows(queryset):
+                seen.add(row[0])
+                yield row
+
+        self.load(rows())
+        with self._lock:
+            for pk in self._row_of if pks is None else pks:
+                row = self._row_of.get(pk)
+                if row is not None and pk not in seen:
+                    self.alive[row] = False
+
+    def _changed_since(self, version):
+        """
+        The pks written between our version and ``version``, or None when the
+        records can't tell (a version reset, expired entries, too many).
+        """
+        if self._version is None or not 0 < version - self._version <= MAX_REPLAY:
+            return None
+        keys = [_change_key(v) for v in range(self._version + 1, version + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            return None
+        return set(changes.values())
+
+    def _ensure_fresh(self):
+        if not self.shared:
+            return
+        now = time.monotonic()
+        if self._loaded and now - self._checked < self.recheck:
+            return
+        # no key yet (or evicted) reads as 0: changes recorded from then on
+        # still apply on top of rows loaded now
+        version = cache.get(RANKING_VERSION_KEY, 0)
+        with self._refresh_lock:
+            self._checked = now
+            if self._loaded and version == self._version:
+                return
+            pks = self._changed_since(version) if self._loaded else None
+            self._version = version
+            self._reload(pks)
+
+    def _record(self, pk):
+        # Every version holds exactly one pk: the entry is claimed with add,
+        # and a version another worker got first is skipped
+        while True:
+            try:
+                version = cache.incr(RANKING_VERSION_KEY)
+            except ValueError:
+                cache.add(RANKING_VERSION_KEY, 0, None)
+                continue
+            if cache.add(_change_key(version), pk, CHANGE_TTL):
+                break
+        with self._lock:
+            if self._loaded and self._version is not None and version == self._version + 1:
+                # only our own write since the last sync
+                self._version = version
+
+    def update(self, profile):
+        with self._lock:
+            if self._loaded:
+                updated_ts = profile.updated.timestamp() if profile.updated else time.time()
+                self._set_row(
+                    profile.pk, profile.skills, profile.location, updated_ts, profile.role
+                )
+        if self.shared:
+            # after commit, so workers re-reading the pk see the new row
+            transaction.on_commit(lambda: self._record(profile.pk))
+
+    def remove(self, pk):
+        with self._lock:
+            row = self._row_of.get(pk)
+            if row is not None:
+                self.alive[row] = False
+        if self.shared:
+            transaction.on_commit(lambda: self._record(pk))
+
+    def scores(self, viewer, now=None):
+        """
+        Score every row for ``viewer``; returns (ids, scores) with ineligible
+        rows (self, same role, removed) scored -inf.
+        """
+        self._ensure_fresh()
+        now = time.time() if now is None else now
+        viewer_bits, viewer_count = skill_bits(viewer.skills)
+        buckets = np.flatnonzero(viewer_bits)
+        viewer_location = location_key(viewer.location)
+        opposite = (
+            Profile.ROLE_DEVELOPER if viewer.role == Profile.ROLE_CLIENT else Profile.ROLE_CLIENT
+        )
+        with self._lock:
+            n = self._size
+            ids = self.ids[:n].copy()
+            packed = self.skills[buckets, : (n + 7) // 8]
+            shared = np.unpackbits(packed, axis=1, count=n).sum(axis=0, dtype=np.float64)
+            same_location = (self.locations[:n] == viewer_location) & (viewer_location != 0)
+            age = np.maximum(now - self.updated[:n], 0.0)
+            roles = self.roles[:n]
+            eligible = self.alive[:n] & ((roles == ROLE_CODES[opposite]) | (roles == 0))
+        scores = (
+            WEIGHT_SKILLS * (shared / max(viewer_count, 1))
+            + WEIGHT_LOCATION * same_location
+            + WEIGHT_RECENCY * np.exp2(-age / RECENCY_HALF_LIFE)
+        )
+        scores[~eligible | (ids == viewer.pk)] = -np.inf
+        return ids, scores
+
+    def top_k(self, viewer, k=50, after=None, now=None):
+        """
+        Best ``k`` (pk, score) pairs for ``viewer``, best first. ``after`` is
+        the last (score, pk) already shown, for paging through the ranking.
+        """
+        ids, scores = self.scores(viewer, now=now)
+        keep = np.isfinite(scores)
+        if after is not None:
+            last_score, last_pk = after
+            keep &= (scores < last_score) | ((scores == last_score) & (ids < last_pk))
+        candidates = np.flatnonzero(keep)
+        if len(candidates) > k:
+            # keep ties at the cut-off in pk order so cursors never skip rows
+            kth = -np.partition(-scores[candidates], k - 1)[k - 1]
+            above = candidates[scores[candidates] > kth]
+            ties = candidates[scores[candidates] == kth]
+            ties = ties[np.argsort(-ids[ties])][: k - len(above)]
+            candidates = np.concatenate([above, ties])
+        order = np.lexsort((-ids[candidates], -scores[candidates]))
+        best = candidates[order]
+        return [(int(ids[i]), float(scores[i])) for i in best]
+
+    def page(self, viewer, cursor=None, page_size=20):
+        """
+        One page of ranked profile ids plus the next cursor. Cursors pin the
+        clock used for recency so scores stay comparable across pages.
+        """
+        now, after = None, None
+        if cursor:
+            try:
+                as_of, score, pk = str(cursor).split(":")
+                now, after = float(as_of), (float(score), int(pk))
+            except ValueError:
+                now, after = None, None
+        now = time.time() if now is None else now
+        ranked = self.top_k(viewer, k=page_size + 1, after=after, now=now)
+        next_cursor = None
+        if len(ranked) > page_size:
+            last_pk, last_score = ranked[page_size - 1]
+            next_cursor = f"{now!r}:{last_score!r}:{last_pk}"
+        return [pk for pk, _ in ranked[:page_size]], next_cursor
+
+
+ranking_engine = RankingEngine()
@@ -0,0 +1,204 @@
+"""
+Discover search backend.
+
+Every Profile carries a denormalized ``search_document`` (name, headline,
+location, skills). On PostgreSQL the 0013 migration adds a generated
+``search_vector`` tsvector column with a GIN index plus a trigram GIN index on
+the document, so a search is an index lookup ranked by relevance. Other
+databases (SQLite test runs) use an in-process inverted index instead.
+"""
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import BooleanField, Case, FloatField, Value, When
+from django.db.models.expressions import RawSQL
+
+from .models import Profile
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+TRIGRAM_THRESHOLD = 0.6  # pg_trgm word_similarity_threshold default
+MAX_FALLBACK_MATCHES = 5000
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or "").lower())
+
+
+def build_search_document(profile):
+    user = profile.user
+    parts = [
+        user.get_full_name(),
+        user.username,
+        profile.headline,
+        profile.location,
+        " ".join(profile.skills or []),
+    ]
+    return " ".join(p for p in parts if p).lower()
+
+
+def refresh_search_document(profile):
+    """
+    Recompute one profile's search document after a write.
+    Uses a single-column UPDATE so it can run right after form saves without
+    touching ``updated``.
+    """
+    document = build_search_document(profile)
+    if profile.search_document != document:
+        profile.search_document = document
+        Profile.objects.filter(pk=profile.pk).update(search_document=document)
+    search_index.update(profile.pk, document)
+    return document
+
+
+def _trigrams(token):
+    padded = f"  {token} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class ProfileSearchIndex:
+    """
+    Pure-Python stand-in for the Postgres indexes: token postings with
+    prefix lookup over a sorted vocabulary and a trigram map for fuzzy terms.
+    Loaded lazily from ``search_document`` and kept current by
+    ``refresh_search_document`` in this process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._postings = defaultdict(set)
+        self._docs = {}
+        self._vocab = []
+        self._trigrams = defaultdict(set)
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        for pk, document in Profile.objects.values_list("pk", "search_document"):
+            self._add(pk, document)
+        self._vocab = sorted(self._postings)
+        self._loaded = True
+
+    def _add(self, pk, document):
+        tokens = set(tokenize(document))
+        self._docs[pk] = tokens
+        for token in tokens:
+            if token not in self._postings:
+                for gram in _trigrams(token):
+                    self._trigrams[gram].add(token)
+            self._postings[token].add(pk)
+
+    def _remove(self, pk):
+        for token in self._docs.pop(pk, ()):
+            postings = self._postings[token]
+            postings.discard(pk)
+            if not postings:
+                del self._postings[token]
+                for gram in _trigrams(token):
+                    self._trigrams[gram].discard(token)
+
+    def update(self, pk, document):
+        with self._lock:
+            if not self._loaded:
+                return
+            self._remove(pk)
+            self._add(pk, document)
+            self._vocab = sorted(self._postings)
+
+    def _expand(self, term):
+        """
+        Vocabulary tokens matching ``term`` with a weight: exact 1.0, prefix
+        0.8, trigram-similar tokens scaled by their similarity.
+        """
+        matches = {}
+        i = bisect_left(self._vocab, term)
+        while i < len(self._vocab) and self._vocab[i].startswith(term):
+            token = self._vocab[i]
+            matches[token] = 1.0 if token == term else 0.8
+            i += 1
+        grams = _trigrams(term)
+        candidates = set()
+        for gram in grams:
+            candidates |= self._trigrams.get(gram, set())
+        for token in candidates - matches.keys():
+            other = _trigrams(token)
+            similarity = len(grams & other) / len(grams | other)
+            if similarity >= TRIGRAM_THRESHOLD:
+                matches[token] = 0.5 * similarity
+        return matches
+
+    def search(self, query):
+        """
+        Return {profile_id: score}; every query term must match something.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return {}
+        with self._lock:
+            self._ensure_loaded()
+            scores = None
+            for term in terms:
+                term_scores = defaultdict(float)
+                for token, weight in self._expand(term).items():
+                    for pk in self._postings[token]:
+                        term_scores[pk] = max(term_scores[pk], weight)
+                if scores is None:
+                    scores = dict(term_scores)
+                else:
+                    scores = {
+                        pk: score + term_scores[pk]
+                        for pk, score in scores.items()
+                        if pk in term_scores
+                    }
+                if not scores:
+                    return {}
+        return scores
+
+
+search_index = ProfileSearchIndex()
+
+
+def _postgres_search(queryset, terms, query):
+    table = Profile._meta.db_table
+    prefix_query = " & ".join(f"{t}:*" for t in terms)
+    rank_sql = (
+        f'(ts_rank("{table}"."search_vector", to_tsquery(\'simple\', %s))'
+        f' + word_similarity(%s, "{table}"."search_document"))::double precision'
+    )
+    match_sql = (
+        f'("{table}"."search_vector" @@ to_tsquery(\'simple\', %s)'
+        f' OR %s <%% "{table}"."search_document")'
+    )
+    return queryset.filter(
+        RawSQL(match_sql, (prefix_query, query), output_field=BooleanField())
+    ).annotate(search_rank=RawSQL(rank_sql, (prefix_query, query), output_field=FloatField()))
+
+
+def _fallback_search(queryset, query):
+    scores = search_index.search(query)
+    if not scores:
+        return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+    best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:MAX_FALLBACK_MATCHES]
+    return queryset.filter(pk__in=[pk for pk, _ in best]).annotate(
+        search_rank=Case(
+            *[When(pk=pk, then=Value(score)) for pk, score in best],
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+    )
+
+
+def search_profiles(queryset, query):
+    """
+    Filter ``queryset`` to profiles matching ``query`` and annotate
+    ``search_rank`` (higher is more relevant).
+    """
+    terms = tokenize(query)
+    if not terms:
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+    if connection.vendor == "postgresql":
+        return _postgres_search(queryset, terms, query.lower())
+    return _fallback_search(queryset, query)
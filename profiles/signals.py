@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver
+
+from .models import Profile
+from .ranking import ranking_engine
+from .skills import release_profile_skills
+
+
+@receiver(post_delete, sender=Profile)
+def drop_from_ranking(sender, instance, **kwargs):
+    ranking_engine.remove(instance.pk)
+
+
+@receiver(pre_delete, sender=Profile)
+def release_skills(sender, instance, **kwargs):
+    # before the cascade, while the profile's skill links still exist
+    release_profile_skills(instance)
@@ -0,0 +1,172 @@
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import ProfileSkill, Skill
+
+POPULAR_SKILLS_CACHE_KEY = "profiles:popular_skills"
+POPULAR_SKILLS_TTL = 300
+SKILL_KEY_MAX_LENGTH = 100
+
+
+def canonical_skill(name):
+    """
+    Collapse whitespace and case-fold so "node.js", " Node.JS " share one row.
+    """
+    display = " ".join(str(name or "").split())[:SKILL_KEY_MAX_LENGTH]
+    return display, display.casefold()
+
+
+def _insert_links(profile, skill_ids):
+    """
+    Link ``profile`` to ``skill_ids``; returns the ids linked here, leaving
+    out links a concurrent save of the same profile created first.
+    """
+    try:
+        with transaction.atomic():
+            ProfileSkill.objects.bulk_create(
+                [ProfileSkill(profile=profile, skill_id=skill_id) for skill_id in skill_ids]
+            )
+        return skill_ids
+    except IntegrityError:
+        pass
+    inserted = []
+    for skill_id in skill_ids:
+        try:
+            with transaction.atomic():
+                ProfileSkill.objects.create(profile=profile, skill_id=skill_id)
+        except IntegrityError:
+            continue
+        inserted.append(skill_id)
+    return inserted
+
+
+def sync_profile_skills(profile):
+    """
+    Mirror ``profile.skills`` into the Skill/ProfileSkill tables, touching
+    only the links that changed and adjusting the cached counts in place.
+    Counts move only for links this call actually inserted or deleted.
+    """
+    wanted = {}
+    for raw in profile.skills or []:
+        display, key = canonical_skill(raw)
+        if key and key not in wanted:
+            wanted[key] = display
+    with transaction.atomic():
+        current = dict(
+            ProfileSkill.objects.filter(profile=profile).values_list("skill__key", "skill_id")
+        )
+        removed = [skill_id for key, skill_id in current.items() if key not in wanted]
+        added = [key for key in wanted if key not in current]
+        if removed:
+            # lock first, so a concurrent save removing the same links can't
+            # have both decrement
+            removed = list(
+                ProfileSkill.objects.select_for_update()
+                .filter(profile=profile, skill_id__in=removed)
+                .values_list("skill_id", flat=True)
+            )
+            ProfileSkill.objects.filter(profile=profile, skill_id__in=removed).delete()
+            Skill.objects.filter(pk__in=removed).update(profile_count=F("profile_count") - 1)
+        if added:
+            existing = dict(Skill.objects.filter(key__in=added).values_list("key", "pk"))
+            missing = [Skill(key=key, name=wanted[key]) for key in added if key not in existing]
+            if missing:
+                Skill.objects.bulk_create(missing, ignore_conflicts=True)
+                existing = dict(Skill.objects.filter(key__in=added).values_list("key", "pk"))
+            inserted = _insert_links(profile, [existing[key] for key in added])
+            Skill.objects.filter(pk__in=inserted).update(profile_count=F("profile_count") + 1)
+    if removed or added:
+        cache.delete(POPULAR_SKILLS_CACHE_KEY)
+
+
+def release_profile_skills(profile):
+    """
+    Take a profile that is about to be deleted out of its skills' counts; its
+    links go with it by cascade.
+    """
+    skill_ids = list(ProfileSkill.objects.filter(profile=profile).values_list("skill_id", flat=True))
+    if skill_ids:
+        Skill.objects.filter(pk__in=skill_ids).update(profile_count=F("profile_count") - 1)
+        transaction.on_commit(lambda: cache.delete(POPULAR_SKILLS_CACHE_KEY))
+
+
+def recount_skills():
+    """
+    Reset every ``profile_count`` from the links; returns how many were off.
+    """
+    links = (
+        ProfileSkill.objects.filter(skill=OuterRef("pk"))
+        .order_by()
+        .values("skill")
+        .annotate(n=Count("profile_id"))
+        .values("n")
+    )
+    with transaction.atomic():
+        drifted = Skill.objects.annotate(actual=Coalesce(Subquery(links), 0)).exclude(
+            profile_count=F("actual")
+        )
+        fixed = drifted.count()
+        if fixed:
+            Skill.objects.update(profile_count=Coalesce(Subquery(links), 0))
+    if fixed:
+        cache.delete(POPULAR_SKILLS_CACHE_KEY)
+    return fixed
+
+
+def skill_keys(values):
+    keys = []
+    for value in values:
+        _, key = canonical_skill(value)
+        if key and key not in keys:
+            keys.append(key)
+    return keys
+
+
+def filter_by_skills(queryset, keys, match_all=False):
+    """
+    Restrict a Profile queryset to holders of ``keys`` (any, or all of them)
+    through the (skill, profile) index rather than scanning the JSON column.
+    """
+    if not keys:
+        return queryset
+    links = ProfileSkill.objects.filter(skill__key__in=keys)
+    if match_all:
+        links = (
+            links.values("profile_id")
+            .annotate(matched=Count("skill_id", distinct=True))
+            .filter(matched=len(keys))
+        )
+    return queryset.filter(pk__in=links.values("profile_id"))
+
+
+def popular_skills(limit=8):
+    """
+    Most common skills with their profile counts, cached between edits.
+    """
+    skills = cache.get(POPULAR_SKILLS_CACHE_KEY)
+    if skills is None:
+        skills = list(
+            Skill.objects.filter(profile_count__gt=0)
+            .order_by("-profile_count", "key")
+            .values("name", "key", "profile_count")[:50]
+        )
+        cache.set(POPULAR_SKILLS_CACHE_KEY, skills, POPULAR_SKILLS_TTL)
+    return skills[:limit]
+
+
+def skill_facets(queryset, limit=8):
+    """
+    Skill counts within a filtered Profile queryset, for narrowing a search.
+    """
+    rows = (
+        ProfileSkill.objects.filter(profile__in=queryset.values("pk"))
+        .values("skill__name", "skill__key")
+        .annotate(profile_count=Count("profile_id"))
+        .order_by("-profile_count", "skill__key")[:limit]
+    )
+    return [
+        {"name": r["skill__name"], "key": r["skill__key"], "profile_count": r["profile_count"]}
+        for r in rows
+    ]
@@ -1,3 +1,175 @@
-from django.test import TestCase
+import threading
+from datetime import date
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import Client, TestCase, TransactionTestCase
+from django.urls import reverse
+
+from .forms import ProfileForm
+from .graph import connection_graph
+from .models import TIER_CONNECTION_LIMITS, Connection, Profile, ProfileSkill, Skill
+from . import quota, skills
+
+
+class ConnectQuotaConcurrencyTests(TransactionTestCase):
+    """
+    The daily connect allowance holds when one profile fires many connect
+    requests at once.
+    """
+
+    TARGETS = 8
+
+    def setUp(self):
+        self.me = self._profile("me", membership_tier="common")
+        self.targets = [self._profile(f"target{i}") for i in range(self.TARGETS)]
+        connection_graph._loaded = False
+
+    def _profile(self, username, **fields):
+        user = User.objects.create_user(username, password="pw")
+        return Profile.objects.create(user=user, **fields)
+
+    def _connect_in_parallel(self, targets):
+        clients = []
+        for _ in targets:
+            client = Client()
+            client.force_login(self.me.user)
+            clients.append(client)
+        start = threading.Barrier(len(targets))
+        statuses = []
+
+        def connect(client, target):
+            try:
+                start.wait()
+                response = client.post(
+                    reverse("profiles:connect_action", args=[target.pk]), {"action": "connect"}
+                )
+                statuses.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=connect, args=(client, target))
+            for client, target in zip(clients, targets)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return statuses
+
+    def test_parallel_connects_never_exceed_tier_limit(self):
+        limit = TIER_CONNECTION_LIMITS["common"]
+        statuses = self._connect_in_parallel(self.targets)
+
+        self.assertEqual(statuses, [302] * self.TARGETS)
+        sent = Connection.objects.filter(requester=self.me).count()
+        self.assertEqual(sent, limit)
+        self.me.refresh_from_db()
+        self.assertEqual(self.me.remaining_connections, 0)
+        self.assertEqual(self.me.last_connection_reset, date.today())
+
+    def test_parallel_connects_after_partial_use(self):
+        self.assertTrue(quota.try_consume(self.me))
+        statuses = self._connect_in_parallel(self.targets)
+
+        self.assertEqual(statuses, [302] * self.TARGETS)
+        sent = Connection.objects.filter(requester=self.me).count()
+        self.assertEqual(sent, TIER_CONNECTION_LIMITS["common"] - 1)
+        self.me.refresh_from_db()
+        self.assertEqual(self.me.remaining_connections, 0)
+
+    def test_profile_edit_keeps_connects_spent_meanwhile(self):
+        # the edit page loaded the profile before a connect went through
+        stale = Profile.objects.get(pk=self.me.pk)
+        self.assertTrue(quota.try_consume(self.me))
+        form = ProfileForm(
+            {"headline": "Engineer", "about": "", "location": "", "skills_text": "Python"},
+            instance=stale,
+            user=stale.user,
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save(stale.user)
+
+        self.me.refresh_from_db()
+        self.assertEqual(self.me.headline, "Engineer")
+        self.assertEqual(self.me.remaining_connections, TIER_CONNECTION_LIMITS["common"] - 1)
+
+
+class MergeReciprocalConnectionsMigrationTests(TransactionTestCase):
+    """
+    0016 folds A->B / B->A rows into the oldest one before 0017 makes the
+    pair unique.
+    """
+
+    before = [("profiles", "0015_connection_canonical_pair")]
+    after = [("profiles", "0017_connection_unique_pair")]
+
+    def _migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_reciprocal_rows_merge_into_the_oldest(self):
+        apps = self._migrate(self.before)
+        HistoricalUser = apps.get_model("auth", "User")
+        HistoricalProfile = apps.get_model("profiles", "Profile")
+        HistoricalConnection = apps.get_model("profiles", "Connection")
+        a, b, c, d = (
+            HistoricalProfile.objects.create(
+                user=HistoricalUser.objects.create(username=name), active_connections=1
+            )
+            for name in "abcd"
+        )
+        both = HistoricalConnection.objects.create(requester=a, receiver=b, status="accepted")
+        HistoricalConnection.objects.create(requester=b, receiver=a, status="accepted")
+        asked = HistoricalConnection.objects.create(requester=a, receiver=c, status="pending")
+        HistoricalConnection.objects.create(requester=c, receiver=a, status="accepted")
+        alone = HistoricalConnection.objects.create(requester=d, receiver=b, status="pending")
+
+        apps = self._migrate(self.after)
+        HistoricalConnection = apps.get_model("profiles", "Connection")
+        HistoricalProfile = apps.get_model("profiles", "Profile")
+        rows = {
+            row.pk: (row.requester_id, row.receiver_id, row.low_id, row.high_id, row.status)
+            for row in HistoricalConnection.objects.all()
+        }
+        self.assertEqual(
+            rows,
+            {
+                both.pk: (a.pk, b.pk, a.pk, b.pk, "accepted"),
+                asked.pk: (a.pk, c.pk, a.pk, c.pk, "accepted"),
+                alone.pk: (d.pk, b.pk, b.pk, d.pk, "pending"),
+            },
+        )
+        # the doubly accepted pair had bumped both counters twice
+        counts = dict(HistoricalProfile.objects.values_list("pk", "active_connections"))
+        self.assertEqual(counts, {a.pk: 0, b.pk: 0, c.pk: 1, d.pk: 1})
+
+
+class SyncProfileSkillsTests(TestCase):
+    def test_link_created_concurrently_is_not_counted_twice(self):
+        profile = Profile.objects.create(user=User.objects.create_user("skilled"))
+        python = Skill.objects.create(name="Python", key="python", profile_count=1)
+        insert_links = skills._insert_links
+
+        def racing(profile, skill_ids):
+            # another save of this profile linked Python after this one read the links
+            ProfileSkill.objects.create(profile=profile, skill=python)
+            return insert_links(profile, skill_ids)
+
+        profile.skills = ["Python", "Go"]
+        with mock.patch.object(skills, "_insert_links", side_effect=racing):
+            skills.sync_profile_skills(profile)
+
+        self.assertEqual(
+            dict(Skill.objects.values_list("key", "profile_count")), {"python": 1, "go": 1}
+        )
+        self.assertEqual(ProfileSkill.objects.filter(profile=profile).count(), 2)
@@ -4,6 +4,7 @@ from .views import (
     ProfileDetailView,
     ProfileEditView,
     DiscoverView,
+    DiscoverFeedView,
     ConnectActionView,
     ProfilePublicView,
     StartConversationView,
@@ -19,6 +20,7 @@ urlpatterns = [
     path("", ProfileDetailView.as_view(), name="detail"),
     path("edit/", ProfileEditView.as_view(), name="edit"),
     path("discover/", DiscoverView.as_view(), name="discover"),
+    path("discover/feed/", DiscoverFeedView.as_view(), name="discover_feed"),
     path("discover/connect/<int:profile_id>/", ConnectActionView.as_view(), name="connect_action"),
     path("discover/message/<int:profile_id>/", StartConversationView.as_view(), name="start_message"),
     path("view/<int:pk>/", ProfilePublicView.as_view(), name="public"),
@@ -3,18 +3,25 @@ import os
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.shortcuts import redirect, render
 from django.http import JsonResponse
+from django.template.loader import render_to_string
 from django.urls import reverse
 from django.views import View
 from django.contrib import messages
 
-from django.db.models import Q
-from datetime import date
+from django.db.models import F, Q
 
 from .forms import ProfileForm, ExperienceFormSet
 from .models import Profile, Experience, Connection
-from messaging.models import Conversation
+from messaging.inbox import open_conversation
 from django.views.generic import TemplateView
 from .paypal import verify_payment, TIER_PRICING
+from . import quota
+from .counters import view_counter
+from .graph import connection_graph
+from .pagination import DISCOVER_PAGE_SIZE, keyset_page, parse_cursor
+from .ranking import ranking_engine
+from .search import search_profiles
+from .skills import filter_by_skills, popular_skills, skill_facets, skill_keys
 
 
 class ProfileDetailView(LoginRequiredMixin, View):
@@ -22,32 +29,12 @@ class ProfileDetailView(LoginRequiredMixin, View):
 
     def get(self, request):
         user = request.user
-        profile, created = Profile.objects.get_or_create(
-            user=user,
-            defaults={
-                "headline": "Full Stack Developer",
-                "bio": "About yourself",
-                "about": "About yourself",
-                "location": "",
-                "skills": ["React", "Node.js", "TypeScript", "PostgreSQL", "AWS"],
-                "remaining_connections": 2,
-            },
-        )
-        # Ensure remaining matches tier on first creation
-        limit = profile.connection_limit
-        if created and limit is not None:
-            profile.remaining_connections = limit
-            profile.last_connection_reset = date.today()
-            profile.save(update_fields=["remaining_connections", "last_connection_reset"])
-        else:
-            profile.reset_daily_connections()
+        profile = request.profile
         experiences = profile.experiences.all()
-        limit = profile.connection_limit
-        remaining_display = "∞" if limit is None else f"{profile.remaining_connections}/{limit}"
         stats = {
             "connections": profile.active_connections,
-            "remaining_today": remaining_display,
-            "views": profile.views,
+            "remaining_today": quota.quota_stats(profile)["remaining_display"],
+            "views": profile.views + view_counter.pending(profile.pk),
         }
         context = {
             "user": user,
@@ -62,26 +49,8 @@ class ProfileDetailView(LoginRequiredMixin, View):
 class DiscoverView(LoginRequiredMixin, View):
     template_name = "profiles/discover.html"
 
-    def get(self, request):
-        user = request.user
-        profile, created = Profile.objects.get_or_create(
-            user=user,
-            defaults={
-                "headline": "Full Stack Developer",
-                "bio": "About yourself",
-                "about": "About yourself",
-                "location": "",
-                "skills": ["React", "Node.js", "TypeScript", "PostgreSQL", "AWS"],
-                "remaining_connections": 2,
-            },
-        )
-        limit = profile.connection_limit
-        if created and limit is not None:
-            profile.remaining_connections = limit
-            profile.last_connection_reset = date.today()
-            profile.save(update_fields=["remaining_connections", "last_connection_reset"])
-        else:
-            profile.reset_daily_connections()
+    @staticmethod
+    def candidate_queryset(profile, query="", skills=(), match_all=False):
         opposite_role = (
             Profile.ROLE_DEVELOPER if profile.role == Profile.ROLE_CLIENT else Profile.ROLE_CLIENT
         )
@@ -90,109 +59,152 @@ class DiscoverView(LoginRequiredMixin, View):
             .exclude(pk=profile.pk)
             .select_related("user")
         )
-        query = request.GET.get("q", "").strip()
+        others = filter_by_skills(others, skill_keys(skills), match_all=match_all)
         if query:
-            others = others.filter(
-                Q(user__username__icontains=query)
-                | Q(user__first_name__icontains=query)
-                | Q(user__last_name__icontains=query)
-                | Q(headline__icontains=query)
-                | Q(location__icontains=query)
-                | Q(skills__icontains=query)
-            )
-        connections = list(
-            Connection.objects.filter(
-                Q(requester=profile, status="accepted") | Q(receiver=profile, status="accepted")
-            )
+            others = search_profiles(others, query)
+        return others
+
+    @staticmethod
+    def filters_from(request):
+        return {
+            "query": request.GET.get("q", "").strip(),
+            "skills": request.GET.getlist("skill"),
+            "match_all": request.GET.get("match") == "all",
+        }
+
+    @classmethod
+    def candidate_page(cls, profile, filters, cursor):
+        others = cls.candidate_queryset(
+            profile, filters["query"], filters["skills"], filters["match_all"]
+        )
+        if not filters["query"] and not filters["skills"]:
+            # Unfiltered feed: order by the in-memory skill-match ranking
+            ids, next_cursor = ranking_engine.page(profile, cursor, DISCOVER_PAGE_SIZE)
+            by_id = others.in_bulk(ids)
+            return others, ([by_id[pk] for pk in ids if pk in by_id], next_cursor)
+        page = keyset_page(
+            others, parse_cursor(cursor), rank_field="search_rank" if filters["query"] else None
+        )
+        return others, page
+
+    def get(self, request):
+        profile = request.profile
+        filters = self.filters_from(request)
+        others, (candidates, next_cursor) = self.candidate_page(
+            profile, filters, request.GET.get("cursor")
         )
-        connections_profiles = [
-            c.receiver if c.requester == profile else c.requester for c in connections
+        connections_profiles = list(
+            Profile.objects.filter(pk__in=connection_graph.neighbors(profile.pk))
+            .select_related("user")
+        )
+        suggestions = connection_graph.suggestions(profile.pk)
+        suggested = Profile.objects.select_related("user").in_bulk([pk for pk, _ in suggestions])
+        people_you_may_know = [
+            {"profile": suggested[pk], "mutual": mutual}
+            for pk, mutual in suggestions
+            if pk in suggested
         ]
-        popular_skills = ["React", "Node.js", "Python", "AWS", "TypeScript", "Docker"]
-        limit = profile.connection_limit
-        stats = {
-            "daily_limit": limit if limit is not None else "∞",
-            "remaining": profile.remaining_connections if limit is not None else "∞",
-            "tier": profile.membership_tier,
-        }
-        # Connection statuses
-        connection_map = {}
-        for c in Connection.objects.filter(
-            Q(requester=profile, receiver__in=others) | Q(receiver=profile, requester__in=others)
-        ):
-            key = c.receiver_id if c.requester == profile else c.requester_id
-            if c.status == "accepted":
-                connection_map[key] = "accepted"
-            elif c.requester == profile:
-                connection_map[key] = c.status
-            else:
-                connection_map[key] = "incoming-pending"
+        if filters["query"] or filters["skills"]:
+            skill_chips = skill_facets(others)
+        else:
+            skill_chips = popular_skills()
+        feed_params = request.GET.copy()
+        feed_params.pop("cursor", None)
+        stats = quota.quota_stats(profile)
+        connection_map = connection_graph.statuses(profile.pk, [c.pk for c in candidates])
         context = {
             "profile": profile,
-            "candidates": others,
+            "candidates": candidates,
+            "next_cursor": next_cursor,
             "connections": connections_profiles,
             "connection_map": connection_map,
-            "popular_skills": popular_skills,
+            "people_you_may_know": people_you_may_know,
+            "popular_skills": skill_chips,
             "stats": stats,
             "discover_label": "Clients" if profile.role == Profile.ROLE_DEVELOPER else "Developers",
-            "query": query,
+            "query": filters["query"],
+            "selected_skills": skill_keys(filters["skills"]),
+            "match_all": filters["match_all"],
+            "feed_params": feed_params.urlencode(),
         }
         return render(request, self.template_name, context)
 
 
+class DiscoverFeedView(LoginRequiredMixin, View):
+    """
+    JSON "next page" endpoint backing the Discover infinite scroll.
+    """
+
+    def get(self, request):
+        profile = request.profile
+        _, (candidates, next_cursor) = DiscoverView.candidate_page(
+            profile, DiscoverView.filters_from(request), request.GET.get("cursor")
+        )
+        context = {
+            "connection_map": connection_graph.statuses(profile.pk, [c.pk for c in candidates]),
+            "stats": quota.quota_stats(profile),
+        }
+        html = "".join(
+            render_to_string(
+                "profiles/partials/candidate_card.html", {**context, "cand": cand}, request=request
+            )
+            for cand in candidates
+        )
+        return JsonResponse({"html": html, "next_cursor": next_cursor})
+
+
 class ConnectActionView(LoginRequiredMixin, View):
+    @staticmethod
+    def _accept(conn, me, target):
+        accepted = Connection.objects.filter(
+            pk=conn.pk, status=Connection.STATUS_PENDING
+        ).update(status=Connection.STATUS_ACCEPTED)
+        if not accepted:
+            return
+        Profile.objects.filter(pk__in=[me.pk, target.pk]).update(
+            active_connections=F("active_connections") + 1
+        )
+        connection_graph.accept(conn.requester_id, conn.receiver_id)
+
     def post(self, request, profile_id):
-        me, _ = Profile.objects.get_or_create(user=request.user)
-        me.reset_daily_connections()
+        me = request.profile
         try:
             target = Profile.objects.get(pk=profile_id)
         except Profile.DoesNotExist:
             return redirect("profiles:discover")
         action = request.POST.get("action", "connect")
         if action == "connect":
-            limit = me.connection_limit
-            if limit is not None and me.remaining_connections <= 0:
+            existing = Connection.objects.between(me, target).first()
+            if existing:
+                if existing.requester_id == target.pk:
+                    # They already asked us: connecting back accepts their request
+                    self._accept(existing, me, target)
+                return redirect("profiles:discover")
+            if not quota.try_consume(me):
                 return redirect("profiles:discover")
             conn, created = Connection.objects.get_or_create(
                 requester=me, receiver=target, defaults={"status": "pending"}
             )
-            if created and limit is not None:
-                me.remaining_connections = max(me.remaining_connections - 1, 0)
-                me.save(update_fields=["remaining_connections"])
+            if created:
+                connection_graph.add_pending(me.pk, target.pk)
+            else:
+                # Lost a race with a concurrent request for the same pair
+                quota.refund(me)
         elif action == "accept":
-            try:
-                conn = Connection.objects.get(requester=target, receiver=me)
-                if conn.status != "accepted":
-                    conn.status = "accepted"
-                    conn.save(update_fields=["status"])
-                    me.active_connections += 1
-                    target.active_connections += 1
-                    me.save(update_fields=["active_connections"])
-                    target.save(update_fields=["active_connections"])
-            except Connection.DoesNotExist:
-                pass
+            conn = Connection.objects.between(me, target).filter(requester=target).first()
+            if conn:
+                self._accept(conn, me, target)
         return redirect("profiles:discover")
 
 
 class StartConversationView(LoginRequiredMixin, View):
-    def _get_conversation(self, me, target):
-        conv = (
-            Conversation.objects.filter(participants=me)
-            .filter(participants=target)
-            .first()
-        )
-        if not conv:
-            conv = Conversation.objects.create()
-            conv.participants.add(me, target)
-        return conv
-
     def get(self, request, profile_id):
-        me, _ = Profile.objects.get_or_create(user=request.user)
+        me = request.profile
         try:
             target = Profile.objects.get(pk=profile_id)
         except Profile.DoesNotExist:
             return redirect("profiles:discover")
-        conv = self._get_conversation(me, target)
+        conv = open_conversation(me, target)
         return redirect(f"{reverse('messaging:inbox')}?conversation={conv.id}")
 
     def post(self, request, profile_id):
@@ -207,15 +219,12 @@ class ProfilePublicView(LoginRequiredMixin, View):
             profile = Profile.objects.select_related("user").get(pk=pk)
         except Profile.DoesNotExist:
             return redirect("profiles:discover")
-        profile.views += 1
-        profile.save(update_fields=["views"])
+        view_counter.incr(profile.pk)
         experiences = profile.experiences.all()
-        limit = profile.connection_limit
-        remaining_display = "∞" if limit is None else f"{profile.remaining_connections}/{limit}"
         stats = {
             "connections": profile.active_connections,
-            "remaining_today": remaining_display,
-            "views": profile.views,
+            "remaining_today": quota.quota_stats(profile)["remaining_display"],
+            "views": profile.views + view_counter.pending(profile.pk),
         }
         context = {
             "user": profile.user,
@@ -232,7 +241,7 @@ class ProfileEditView(LoginRequiredMixin, View):
     http_method_names = ["get", "post", "head", "options"]
 
     def get(self, request):
-        profile, _ = Profile.objects.get_or_create(user=request.user)
+        profile = request.profile
         form = ProfileForm(instance=profile, user=request.user)
         exp_formset = ExperienceFormSet(queryset=profile.experiences.all())
         return render(
@@ -242,7 +251,7 @@ class ProfileEditView(LoginRequiredMixin, View):
         )
 
     def post(self, request):
-        profile, _ = Profile.objects.get_or_create(user=request.user)
+        profile = request.profile
         form = ProfileForm(
             request.POST, request.FILES, instance=profile, user=request.user
         )
@@ -286,7 +295,7 @@ class HomeView(TemplateView):
         return ctx
 
     def post(self, request):
-        profile, _ = Profile.objects.get_or_create(user=request.user)
+        profile = request.profile
         form = ProfileForm(
             request.POST, request.FILES, instance=profile, user=request.user
         )
@@ -309,19 +318,7 @@ class UpgradePlanView(LoginRequiredMixin, View):
         if not verify_payment(payment_token, tier):
             messages.error(request, "Payment verification failed. Please complete payment and retry.")
             return redirect(reverse("profiles:checkout", args=[tier]))
-        profile, _ = Profile.objects.get_or_create(user=request.user)
-        # compute used connections under current plan
-        current_limit = profile.connection_limit
-        used = 0
-        if current_limit is not None:
-            used = max(current_limit - profile.remaining_connections, 0)
-
-        profile.membership_tier = tier
-        new_limit = profile.connection_limit
-        if new_limit is not None:
-            profile.remaining_connections = max(new_limit - used, 0)
-        profile.last_connection_reset = date.today()
-        profile.save(update_fields=["membership_tier", "remaining_connections", "last_connection_reset"])
+        quota.change_tier(request.profile, tier)
         return redirect("profiles:detail")
 
 
@@ -341,7 +338,7 @@ class CheckoutView(LoginRequiredMixin, TemplateView):
 
 class ToggleShareView(LoginRequiredMixin, View):
     def post(self, request):
-        profile, _ = Profile.objects.get_or_create(user=request.user)
+        profile = request.profile
         profile.share_enabled = not profile.share_enabled
         profile.save(update_fields=["share_enabled"])
         return redirect("profiles:detail")